@@ -1,7 +1,11 @@
-from fastapi import FastAPI, BackgroundTasks
+from fastapi import FastAPI, BackgroundTasks, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+from typing import Dict, List, Optional
+import math
 import threading
+import time
+import pandas as pd
 from cqpa_agent import ClinkerQualityPredictionAgent, llm_reasoner
 from simulation_state import simulation_status, reset_simulation_status
 
@@ -55,6 +59,40 @@ def start_simulation(background_tasks: BackgroundTasks):
     
     return {"message": "Simulation started successfully"}
 
+class BatchPredictRequest(BaseModel):
+    # null or non-numeric values are rejected with a 422 whose `loc` names the row index
+    rows: List[Dict[str, float]]
+    chunk_size: Optional[int] = Field(default=None, gt=0)
+
+# Model used for bulk scoring, loaded on first use
+scoring_agent = None
+scoring_lock = threading.Lock()
+
+def get_scoring_agent():
+    global scoring_agent
+    with scoring_lock:
+        if scoring_agent is None:
+            scoring_agent = ClinkerQualityPredictionAgent()
+    return scoring_agent
+
+@app.post("/predict-batch")
+def predict_batch(request: BatchPredictRequest):
+    """Score many wide-format rows (feature name -> value) in one vectorized call"""
+    for i, row in enumerate(request.rows):
+        for name, value in row.items():
+            if not math.isfinite(value):
+                raise HTTPException(status_code=422, detail=f"rows[{i}]: {name} is not a finite number")
+    agent = get_scoring_agent()
+    start = time.perf_counter()
+    predictions = agent.predict_batch(pd.DataFrame(request.rows), chunk_size=request.chunk_size)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    return {
+        "predictions": predictions.tolist(),
+        "alerts": (predictions > agent.threshold).tolist(),
+        "threshold": agent.threshold,
+        "elapsed_ms": elapsed_ms
+    }
+
 @app.get("/simulation-status")
 def get_simulation_status():
     return simulation_status
@@ -13,16 +13,97 @@ from google.adk.runners import Runner
 from google.adk.sessions import InMemorySessionService
 from google.genai import types
 import asyncio
+from typing import NamedTuple
 warnings.filterwarnings('ignore')
 from dotenv import load_dotenv
 from simulation_state import simulation_status, SimulationEvent
 load_dotenv()
 
+class HistoryWindow(NamedTuple):
+    """Views over the newest rows of a PredictionHistory, oldest first"""
+    feature_columns: list
+    timestamps: np.ndarray
+    features: np.ndarray
+    predictions: np.ndarray
+    alerts: np.ndarray
+    target_column: str = None
+    targets: np.ndarray = None
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def to_records(self):
+        """One dict per row, in the shape the LLM tools take"""
+        records = []
+        for i in range(len(self.timestamps)):
+            record = {'timestamp': pd.Timestamp(self.timestamps[i])}
+            record.update(zip(self.feature_columns, self.features[i].tolist()))
+            record['prediction'] = float(self.predictions[i])
+            record['alert'] = bool(self.alerts[i])
+            if self.target_column is not None and not np.isnan(self.targets[i]):
+                record[self.target_column] = float(self.targets[i])
+            records.append(record)
+        return records
+
+    def summary(self):
+        """Same averages as get_recent_metrics, straight from the columns"""
+        if len(self.timestamps) == 0:
+            return {}
+        summary = {f"{col}_avg": float(v) for col, v in zip(self.feature_columns, self.features[-10:].mean(axis=0))}
+        summary['prediction_avg'] = float(self.predictions[-10:].mean())
+        # the target is only known for some rows (NaN otherwise), so skip
+        # unknowns like the DataFrame mean does, and omit it if none are known
+        if self.target_column is not None and not np.isnan(self.targets).all():
+            summary[f"{self.target_column}_avg"] = float(np.nanmean(self.targets[-10:]))
+        return summary
+
+class PredictionHistory:
+    """
+    Fixed-capacity ring buffer of replayed predictions, stored as typed
+    columns (timestamp, one float per feature, prediction, alert flag, and the
+    measured target where the data has it, NaN otherwise).
+
+    Every row is written twice, `capacity` slots apart, so the newest n rows
+    are always one contiguous slice and recent(n) returns views, not copies.
+    Memory stays at 2 x capacity rows however long the replay runs.
+    """
+    def __init__(self, feature_columns, capacity=1000, target_column=None):
+        self.feature_columns = list(feature_columns)
+        self.target_column = target_column
+        self.capacity = capacity
+        self.timestamps = np.empty(2 * capacity, dtype='datetime64[ns]')
+        self.features = np.empty((2 * capacity, len(self.feature_columns)))
+        self.predictions = np.empty(2 * capacity)
+        self.alerts = np.zeros(2 * capacity, dtype=bool)
+        self.targets = np.full(2 * capacity, np.nan)
+        self.count = 0  # rows appended so far
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def append(self, timestamp, features, prediction, alert, target=np.nan):
+        i = self.count % self.capacity
+        timestamp = pd.Timestamp(timestamp).to_datetime64()
+        for j in (i, i + self.capacity):
+            self.timestamps[j] = timestamp
+            self.features[j] = features
+            self.predictions[j] = prediction
+            self.alerts[j] = alert
+            self.targets[j] = target
+        self.count += 1
+
+    def recent(self, n):
+        n = max(0, min(int(n), len(self)))
+        end = (self.count - 1) % self.capacity + self.capacity + 1 if self.count else 0
+        sl = slice(end - n, end)
+        return HistoryWindow(self.feature_columns, self.timestamps[sl], self.features[sl],
+                             self.predictions[sl], self.alerts[sl], self.target_column, self.targets[sl])
+
 class ClinkerQualityPredictionAgent:
     def __init__(self, model_path='models/freelime_model.pkl', 
                  scaler_path='models/freelime_scaler.pkl',
                  info_path='models/model_info.pkl',
-                 threshold=2.5):
+                 threshold=2.5, history_size=1000):
         
         print("Loading CQPA model...")
         self.model = joblib.load(model_path)
@@ -38,7 +119,8 @@ class ClinkerQualityPredictionAgent:
         print(f"Alert threshold: {self.threshold}")
         
         # For tracking predictions
-        self.prediction_history = []
+        self.prediction_history = PredictionHistory(self.feature_columns, capacity=history_size,
+                                                   target_column=self.target_column)
         self.alert_count = 0
 
     def predict_freelime(self, row_data):
@@ -64,6 +146,48 @@ class ClinkerQualityPredictionAgent:
             print(f"Prediction error: {e}")
             return None
 
+    def feature_frame(self, df):
+        """
+        Align a wide frame to the model's feature columns in one step
+        (missing features, and features absent from only some rows, default
+        to 0 as in predict_freelime)
+        """
+        return df.reindex(columns=self.feature_columns).fillna(0).astype(float)
+
+    def predict_batch(self, df, chunk_size=None):
+        """
+        Predict Free Lime for every row of `df` with one scaler/model call,
+        or one per `chunk_size` rows when given. Returns a float array.
+        """
+        X = self.feature_frame(df)
+        if len(X) == 0:
+            return np.empty(0)
+        if not chunk_size or len(X) <= chunk_size:
+            return self.model.predict(self.scaler.transform(X))
+        predictions = np.empty(len(X))
+        for start in range(0, len(X), chunk_size):
+            chunk = X.iloc[start:start + chunk_size]
+            predictions[start:start + chunk_size] = self.model.predict(self.scaler.transform(chunk))
+        return predictions
+
+    def replay(self, df, loop=True):
+        """
+        Precompute aligned features and predictions for all of `df` once, then
+        yield (timestamp, features, prediction, target) per row, replaying forever
+        if `loop`. target is the measured value, or NaN where `df` has none
+        """
+        timestamps = df['timestamp'].tolist()
+        features = self.feature_frame(df).to_numpy()
+        predictions = self.predict_batch(df).tolist()
+        if self.target_column in df.columns:
+            targets = df[self.target_column].astype(float).tolist()
+        else:
+            targets = [np.nan] * len(df)
+        while True:
+            yield from zip(timestamps, features, predictions, targets)
+            if not loop:
+                return
+
     def simulate_realtime_monitoring(self, test_quality_path, llm_callback):
         """
         Simulate real-time monitoring using test data
@@ -80,52 +204,41 @@ class ClinkerQualityPredictionAgent:
         session_service = InMemorySessionService()
         runner = Runner(agent=llm_agent, app_name="CQPA_APP", session_service=session_service)
         
-        while True:
-            for idx, (_, row) in enumerate(df_test.iterrows()):
-                timestamp = row['timestamp']
-                
-                # Make prediction
-                prediction = self.predict_freelime(row)
-                
-                if prediction is not None:
-                    new_history_item = row.to_dict()
-                    new_history_item['prediction'] = prediction
-                    new_history_item['alert'] = prediction > self.threshold
-                    self.prediction_history.append(new_history_item)
-                    
-                    print(f"[{timestamp}] Free Lime Prediction: {prediction:.4f}")
-                    
-                    event = SimulationEvent(timestamp=str(timestamp), prediction=prediction)
-                    
-                    # Check if alert threshold exceeded
-                    if prediction > self.threshold:
-                        self.alert_count += 1
-                        alert_message = f"🚨 ALERT #{self.alert_count}: Free Lime {prediction:.4f} exceeds threshold {self.threshold}"
-                        print(alert_message)
-                        event.alert = alert_message
-                        
-                        # Get recent context as a list of dicts
-                        recent_context = self.get_recent_context(10)
-                        
-                        # Trigger LLM callback
-                        session_id = f"session_{timestamp.strftime('%Y%m%d%H%M%S')}"
-                        llm_response = asyncio.run(llm_callback(runner, recent_context, prediction, session_id))
-                        event.llm_response = llm_response
-                    
-                    simulation_status.events.append(event)
-                    
-                    # Simulate real-time delay
-                    time.sleep(2)
-        
+        for timestamp, features, prediction, target in self.replay(df_test):
+            self.prediction_history.append(timestamp, features, prediction, prediction > self.threshold, target)
+
+            print(f"[{timestamp}] Free Lime Prediction: {prediction:.4f}")
+
+            event = SimulationEvent(timestamp=str(timestamp), prediction=prediction)
+
+            # Check if alert threshold exceeded
+            if prediction > self.threshold:
+                self.alert_count += 1
+                alert_message = f"🚨 ALERT #{self.alert_count}: Free Lime {prediction:.4f} exceeds threshold {self.threshold}"
+                print(alert_message)
+                event.alert = alert_message
+
+                # Get recent context as column views
+                recent_context = self.get_recent_context(10)
+
+                # Trigger LLM callback
+                session_id = f"session_{timestamp.strftime('%Y%m%d%H%M%S')}"
+                llm_response = asyncio.run(llm_callback(runner, recent_context, prediction, session_id))
+                event.llm_response = llm_response
+
+            simulation_status.events.append(event)
+
+            # Simulate real-time delay
+            time.sleep(2)
+
         print(f"\nSimulation complete. Total alerts: {self.alert_count}")
 
     def get_recent_context(self, n=10):
         """
-        Get recent prediction history for context
+        Get recent prediction history for context (a HistoryWindow of views;
+        call to_records() where dicts are needed)
         """
-        if len(self.prediction_history) < n:
-            return self.prediction_history
-        return self.prediction_history[-n:]
+        return self.prediction_history.recent(n)
 
 from typing import List, Dict, Any
 
@@ -246,13 +359,16 @@ async def llm_reasoner(runner, context_rows, predicted_free_lime, session_id):
     # Create a new session for each invocation
     await runner.session_service.create_session(app_name=runner.app_name, user_id=user_id, session_id=session_id)
 
-    summary = get_recent_metrics(context_rows)
-    
-    # Convert to DataFrame to get the last timestamp
-    context_df = pd.DataFrame(context_rows)
+    if isinstance(context_rows, HistoryWindow):
+        # Summarise the column views directly; no per-row dicts needed
+        summary = context_rows.summary()
+        last_timestamp = pd.Timestamp(context_rows.timestamps[-1])
+    else:
+        summary = get_recent_metrics(context_rows)
+        last_timestamp = pd.DataFrame(context_rows).iloc[-1]["timestamp"]
     
     input_data = {
-        "timestamp": str(context_df.iloc[-1]["timestamp"]),
+        "timestamp": str(last_timestamp),
         "predicted_free_lime": float(predicted_free_lime),
         "recent_metrics": summary
     }
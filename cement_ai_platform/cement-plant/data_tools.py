@@ -1,14 +1,106 @@
+import os
+import json
+import hashlib
 import pandas as pd
 import numpy as np
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import StandardScaler
 
-def load_and_pivot_quality_data(quality_csv_path):
+# Pivoted datasets are cached here, next to a manifest describing their source
+CACHE_DIR = os.environ.get('CQPA_CACHE_DIR', 'cache')
+# Bump when a cached build function changes its output
+CACHE_VERSION = 1
+
+def _file_hash(path, block_size=1 << 20):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            h.update(block)
+    return h.hexdigest()
+
+def _write_frame(df, path):
+    # Written under a temporary name and renamed, so readers never see a partial file
+    try:
+        df.to_parquet(path + '.parquet.tmp', index=False)
+        ext = '.parquet'
+    except ImportError:
+        # No parquet engine installed: a pickle is still a fast binary format
+        df.to_pickle(path + '.pkl.tmp')
+        ext = '.pkl'
+    os.replace(path + ext + '.tmp', path + ext)
+    return path + ext
+
+def _write_manifest(manifest, path):
+    with open(path + '.tmp', 'w') as f:
+        json.dump(manifest, f)
+    os.replace(path + '.tmp', path)
+
+def _read_frame(path):
+    return pd.read_parquet(path) if path.endswith('.parquet') else pd.read_pickle(path)
+
+def cached_dataset(source_path, build, name):
+    """
+    Return build(source_path), cached on disk under CACHE_DIR.
+
+    The cache entry is keyed by the source's absolute path and `name`, and its
+    manifest records the source size, mtime and content hash. A matching size
+    and mtime is a hit without reading the source; otherwise the source is
+    hashed, and only a changed hash triggers a rebuild.
+    """
+    source = os.path.abspath(source_path)
+    st = os.stat(source)
+    key = hashlib.sha256(f"{name}:{source}".encode()).hexdigest()[:16]
+    base = os.path.join(CACHE_DIR, f"{name}-{key}")
+    manifest_path = base + '.json'
+
+    manifest = None
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        if manifest.get('version') != CACHE_VERSION or not os.path.exists(manifest.get('data', '')):
+            manifest = None
+
+    if manifest is not None:
+        if manifest['size'] == st.st_size and manifest['mtime_ns'] == st.st_mtime_ns:
+            return _read_frame(manifest['data'])
+        content_hash = _file_hash(source)
+        if manifest['size'] == st.st_size and manifest['sha256'] == content_hash:
+            # Touched but unchanged: remember the new mtime and reuse the data
+            manifest['mtime_ns'] = st.st_mtime_ns
+            _write_manifest(manifest, manifest_path)
+            return _read_frame(manifest['data'])
+    else:
+        content_hash = _file_hash(source)
+
+    df = build(source_path)
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    manifest = {
+        'version': CACHE_VERSION,
+        'source': source,
+        'size': st.st_size,
+        'mtime_ns': st.st_mtime_ns,
+        'sha256': content_hash,
+        'data': _write_frame(df, base)
+    }
+    _write_manifest(manifest, manifest_path)
+    return df
+
+def load_and_pivot_quality_data(quality_csv_path, use_cache=True):
     """
     Load quality data in long format and pivot to wide format
+    (served from the dataset cache unless use_cache is False)
     """
+    if use_cache:
+        return cached_dataset(quality_csv_path, _pivot_quality_csv, 'quality_pivot')
+    return _pivot_quality_csv(quality_csv_path)
+
+def _read_quality_csv(quality_csv_path):
     df_quality = pd.read_csv(quality_csv_path)
     df_quality['Timestamp_Shifted'] = pd.to_datetime(df_quality['Timestamp_Shifted'])
+    return df_quality
+
+def _pivot_quality_csv(quality_csv_path):
+    df_quality = _read_quality_csv(quality_csv_path)
     
     # Pivot to wide format
     df_pivoted = df_quality.pivot_table(
@@ -20,9 +112,86 @@ def load_and_pivot_quality_data(quality_csv_path):
     
     # Rename timestamp column
     df_pivoted = df_pivoted.rename(columns={'Timestamp_Shifted': 'timestamp'})
+    df_pivoted.columns.name = None
     
     return df_pivoted
 
+class SparseQualityData:
+    """
+    Long-format quality readings kept sparse: one sorted (timestamp, value)
+    array pair per parameter, instead of a mostly-NaN wide frame.
+
+    Lookups are as-of (the latest reading at or before the query time), so
+    aligning k query timestamps costs O(k log n) per parameter, where n is
+    that parameter's number of readings.
+    """
+    def __init__(self, series):
+        # series: {parameter: (datetime64[ns] array, float array)}, sorted by time
+        self.series = series
+        self.parameters = sorted(series)
+
+    @classmethod
+    def from_long(cls, df_quality, time_col='Timestamp_Shifted', param_col='Parameter', value_col='Value'):
+        df = df_quality[[time_col, param_col, value_col]].dropna(subset=[value_col])
+        df = df.sort_values([param_col, time_col], kind='stable')
+        # Same rule as the pivot: the first reading wins when a timestamp repeats
+        df = df.drop_duplicates(subset=[param_col, time_col], keep='first')
+        times = df[time_col].to_numpy(dtype='datetime64[ns]')
+        values = df[value_col].to_numpy(dtype=float)
+        params = df[param_col].to_numpy()
+        # Each parameter is one contiguous run after the sort
+        starts = np.flatnonzero(np.r_[True, params[1:] != params[:-1]])
+        ends = np.r_[starts[1:], len(params)]
+        return cls({params[i]: (times[i:j], values[i:j]) for i, j in zip(starts, ends)})
+
+    @classmethod
+    def from_csv(cls, quality_csv_path, use_cache=True):
+        if use_cache:
+            return cls.from_long(cached_dataset(quality_csv_path, _read_quality_csv, 'quality_long'))
+        return cls.from_long(_read_quality_csv(quality_csv_path))
+
+    def __len__(self):
+        return sum(len(t) for t, _ in self.series.values())
+
+    def counts(self):
+        return {p: len(self.series[p][0]) for p in self.parameters}
+
+    def nbytes(self):
+        return sum(t.nbytes + v.nbytes for t, v in self.series.values())
+
+    def timestamps(self):
+        """Sorted union of all reading times (the index of the dense pivot)"""
+        return np.unique(np.concatenate([t for t, _ in self.series.values()]))
+
+    def asof(self, parameter, when, backfill=False):
+        """
+        Value of `parameter` at each time in `when` (scalar or array-like).
+        Before its first reading the value is NaN, or that first reading if `backfill`.
+        """
+        times, values = self.series[parameter]
+        when = np.asarray(when, dtype='datetime64[ns]')
+        idx = np.searchsorted(times, when, side='right') - 1
+        if backfill:
+            return values[np.maximum(idx, 0)]
+        out = values[np.maximum(idx, 0)]
+        return np.where(idx >= 0, out, np.nan)
+
+    def dense(self, when=None, parameters=None, backfill=True):
+        """
+        Wide frame with one row per query time and one column per parameter.
+        Defaults (all reading times, backfill) reproduce
+        load_and_pivot_quality_data(...).ffill().bfill().
+        """
+        when = self.timestamps() if when is None else np.asarray(when, dtype='datetime64[ns]')
+        parameters = self.parameters if parameters is None else parameters
+        data = {'timestamp': when}
+        for p in parameters:
+            if p in self.series:
+                data[p] = self.asof(p, when, backfill=backfill)
+            else:
+                data[p] = np.full(len(when), np.nan)
+        return pd.DataFrame(data)
+
 def load_process_data(process_csv_path):
     """
     Load process data - assuming it exists based on the original implementation
@@ -40,23 +209,19 @@ def prepare_freelime_dataset(quality_csv_path, process_csv_path=None):
     """
     Prepare dataset for Free Lime prediction
     """
-    # Load quality data
-    df_quality = load_and_pivot_quality_data(quality_csv_path)
-    
     # Load process data if available
     df_proc = load_process_data(process_csv_path) if process_csv_path else None
     
     if df_proc is not None:
-        # Merge process and quality data
-        df = pd.merge_asof(
-            df_proc.sort_values('timestamp'),
-            df_quality.sort_values('timestamp'),
-            on='timestamp',
-            direction='backward'
-        )
+        # Latest reading of each quality parameter at every process timestamp,
+        # aligned straight from the sparse readings
+        quality = SparseQualityData.from_csv(quality_csv_path)
+        df_proc = df_proc.sort_values('timestamp').reset_index(drop=True)
+        df_quality = quality.dense(df_proc['timestamp'], backfill=False).drop(columns='timestamp')
+        df = pd.concat([df_proc, df_quality], axis=1)
     else:
         # Use only quality data
-        df = df_quality.copy()
+        df = load_and_pivot_quality_data(quality_csv_path)
     
     # Handle missing values by filling forward and then backward
     df = df.ffill().bfill()
@@ -0,0 +1,41 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+pytest.importorskip("google.adk")  # cqpa_agent builds its LLM agent at import
+from fastapi.testclient import TestClient
+import api
+from cqpa_agent import ClinkerQualityPredictionAgent
+
+MODELS = ROOT / "models"
+
+
+@pytest.fixture(scope="module")
+def client():
+    api.scoring_agent = ClinkerQualityPredictionAgent(
+        str(MODELS / "freelime_model.pkl"), str(MODELS / "freelime_scaler.pkl"), str(MODELS / "model_info.pkl"))
+    yield TestClient(api.app)
+    api.scoring_agent = None
+
+
+def test_mixed_keys_score_like_predict_freelime(client):
+    features = api.scoring_agent.feature_columns
+    rows = [
+        {features[0]: 1.0, features[1]: 2.0},
+        {features[1]: 3.0, features[2]: 4.0},
+        {},
+    ]
+    r = client.post("/predict-batch", json={"rows": rows})
+    assert r.status_code == 200
+    expected = [api.scoring_agent.predict_freelime(row) for row in rows]
+    assert r.json()["predictions"] == pytest.approx(expected)
+
+
+def test_empty_batch(client):
+    r = client.post("/predict-batch", json={"rows": []})
+    assert r.status_code == 200
+    assert r.json()["predictions"] == []
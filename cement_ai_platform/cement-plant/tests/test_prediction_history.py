@@ -0,0 +1,50 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+pytest.importorskip("google.adk")  # cqpa_agent builds its LLM agent at import
+from cqpa_agent import PredictionHistory, get_recent_metrics
+from data_tools import load_and_pivot_quality_data
+
+TRAIN_QUALITY = ROOT / "archive" / "CAX_Train_Quality (1)" / "CAX_Train_Quality.csv"
+TARGET = "Output Parameter"
+
+
+@pytest.fixture(scope="module")
+def pivoted():
+    df = load_and_pivot_quality_data(str(TRAIN_QUALITY), use_cache=False)
+    # keep the sparse target as-is, only fill the features
+    features = [c for c in df.columns if c not in ("timestamp", TARGET)]
+    df[features] = df[features].ffill().bfill()
+    return df.head(40).reset_index(drop=True), features
+
+
+def fill(df, features, capacity):
+    history = PredictionHistory(features, capacity=capacity, target_column=TARGET)
+    for i, row in df.iterrows():
+        prediction = 1.5 + 0.1 * i
+        history.append(row["timestamp"], row[features].to_numpy(dtype=float), prediction,
+                       prediction > 2.5, row[TARGET])
+    return history
+
+
+@pytest.mark.parametrize("n", [1, 5, 10, 16])
+def test_summary_matches_get_recent_metrics(pivoted, n):
+    df, features = pivoted
+    window = fill(df, features, capacity=16).recent(n)
+    expected = get_recent_metrics(window.to_records())
+    assert f"{TARGET}_avg" in window.summary()
+    assert window.summary() == pytest.approx(expected, nan_ok=True)
+
+
+def test_summary_without_target(pivoted):
+    df, features = pivoted
+    df = df.assign(**{TARGET: np.nan})
+    window = fill(df, features, capacity=16).recent(10)
+    assert f"{TARGET}_avg" not in window.summary()
+    assert window.summary() == pytest.approx(get_recent_metrics(window.to_records()))
@@ -1,47 +1,263 @@
-import asyncio
-from datetime import datetime
-from fastapi import FastAPI, HTTPException, Query
+import asyncio, json, time
+from typing import List, Optional
+import numpy as np
+from datetime import datetime, timezone
+from fastapi import APIRouter, Depends, FastAPI, HTTPException, Query, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from sqlmodel import SQLModel
 from qc.config import settings
-from qc.storage import init_engine, recent_samples, log_audit, get_audits, SampleORM
-from qc.simulator import PlantSim, run_sim
-from qc.detector import DriftDetector
-from qc.schemas import Sample, Plan, PlanResult, DisturbanceRequest, Knobs, ConfigGet, ConfigPatch, PlanAction
-from qc.planner_gemini import propose_plan
-from qc.safety import clamp_actions
-from qc.actions import simulate_after
+from qc.storage import init_engine, last_sample_ts, recent_samples, recent_columns, recent_arrays, get_audits, SampleORM, SampleWriter, AuditWriter, DBExecutor
+from qc.simulator import run_sim
+from qc.clock import clock, MODES
+from qc.ensemble import EnsembleSim, band_risk
+from qc.live import CHANNELS
+from qc.downsample import bucketize, lttb_indices, bucket_rows, bucket_columns
+from qc.retention import RetentionWorker, series_buckets
+from qc.plants import PlantLine, PlantRegistry
+from qc.schemas import Sample, Plan, PlanResult, DisturbanceRequest, Knobs, ConfigGet, ConfigPatch, PlanAction, PlanBatchRequest, PlanBatchResult, RiskRequest, RiskResult
+from qc.planner_gemini import propose_plan, explain_plan
+from qc.planner_local import propose_plan_local
+from qc.safety import clamp_actions, clamp_delta_matrix
+from qc.actions import simulate_after, simulate_after_batch, actions_to_arrays, band_distance, KNOBS
 
 app = FastAPI(title="QC Mini-Copilot Backend")
-app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
+app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"],
+                   expose_headers=["X-Last-Seq"])
 
 engine = init_engine(settings.DB_PATH)
-plant = PlantSim()
-detector = DriftDetector(win=int(settings.WINDOW_SECONDS))
+plants = PlantRegistry(settings.PLANT_IDS.split(","))
+writer = SampleWriter(engine)
+retention = RetentionWorker(engine, writer=writer, plant_ids=plants.ids)
+audit_writer = AuditWriter(engine)
+db_io = DBExecutor()
+
+def get_line(plant_id: Optional[str] = None) -> PlantLine:
+    # path parameter under /plants/{plant_id}; an optional query parameter on the unprefixed routes
+    line = plants.get(plant_id)
+    if line is None:
+        raise HTTPException(404, f"unknown plant {plant_id!r}")
+    return line
+
+# per-line routes, mounted at /plants/{plant_id} and (for the default line) at the root
+router = APIRouter()
 
 @app.on_event("startup")
 async def startup():
-    asyncio.create_task(run_sim(engine, plant))
+    # warm the live buffer from the durable history so windows survive restarts
+    # (sim time continues after the stored history, which may be ahead of the wall clock)
+    clock.resume_after(await db_io.run(last_sample_ts, engine))
+    for line in plants:
+        await db_io.run(line.warm, engine)
+    writer.start()
+    audit_writer.start()
+    retention.start()
+    asyncio.create_task(run_sim(plants, writer))
+
+@app.on_event("shutdown")
+def shutdown():
+    retention.close()
+    writer.close()
+    audit_writer.close()
+    db_io.close()
 
 @app.get("/health")
 def health():
-    return {"ok": True, "ts": datetime.utcnow().isoformat()}
-
-@app.get("/state/current", response_model=Sample)
-def state_current():
-    rows = recent_samples(engine, seconds=10)
-    if not rows: raise HTTPException(503, "no data yet")
-    r = rows[-1]
-    detector.push(r.__dict__)
-    return Sample(**r.__dict__)
-
-@app.get("/state/series")
-def state_series(last_seconds: int = 600):
-    rows = recent_samples(engine, seconds=last_seconds)
-    return [r.__dict__ for r in rows]
-
-@app.get("/config", response_model=ConfigGet)
-def get_config():
+    return {"ok": True, "ts": datetime.utcnow().isoformat(), "sim_ts": clock.now().isoformat()}
+
+@app.get("/sim/clock")
+def sim_clock():
+    return clock.stats()
+
+@app.patch("/sim/clock")
+def sim_clock_patch(mode: str = Query(pattern=f"^({'|'.join(MODES)})$"), speed: float = Query(default=1.0, gt=0)):
+    """Switch pacing at runtime: realtime, accelerated (`speed`x) or fast (unpaced)."""
+    clock.set_mode(mode, speed)
+    return clock.stats()
+
+@app.get("/storage/stats")
+def storage_stats():
+    return {"samples": writer.stats(), "retention": retention.stats(), "audit": audit_writer.stats(), "io": db_io.stats()}
+
+@app.get("/plants")
+def list_plants():
+    return [{"plant_id": line.id, "default": line is plants.default, "seq": line.ring.seq,
+             "issue": line.detection.current is not None} for line in plants]
+
+@router.get("/state/current", response_model=Sample)
+def state_current(line: PlantLine = Depends(get_line)):
+    r = line.ring.latest()
+    if r is None: raise HTTPException(503, "no data yet")
+    return Sample(**r)
+
+def _ring_covers(ring, seconds: float) -> bool:
+    # the ring is only warmed with its own capacity of history, so longer windows go to the DB
+    return seconds <= ring.capacity * settings.TICK_SECONDS and ring.covers(seconds)
+
+@router.get("/state/series")
+async def state_series(last_seconds: int = 600, format: str = Query(default="rows", pattern="^(rows|columns)$"),
+                       bucket_seconds: float = Query(default=None, gt=0, description="aggregate into fixed buckets (min/max/mean/last)"),
+                       max_points: int = Query(default=None, ge=3, description="cap on points returned"),
+                       method: str = Query(default="buckets", pattern="^(buckets|lttb)$"),
+                       line: PlantLine = Depends(get_line)):
+    """
+    Raw samples by default. With `bucket_seconds` or `max_points` the window is
+    thinned server-side: `method=buckets` aggregates fixed buckets (width
+    `bucket_seconds`, or window / `max_points`), `method=lttb` keeps at most
+    `max_points` (or window / `bucket_seconds`) shape-preserving samples.
+    Windows older than the raw retention horizon, and buckets of a minute or
+    more beyond the live buffer, are served from the rollup tables.
+
+    The `X-Last-Seq` header is the newest sample seq when the window was read;
+    pass it as `since` to `/state/stream` to continue without a gap (a sample
+    appended meanwhile may be both in the window and on the stream).
+    """
+    seq = line.ring.seq
+    # windows beyond the live buffer read the database: run those on the I/O executor.
+    # Either way the response is encoded on the worker thread, not the event loop.
+    run = run_in_threadpool if _ring_covers(line.ring, last_seconds) else db_io.run
+    resp = await run(_json_response, _series, line, last_seconds, format, bucket_seconds, max_points, method)
+    resp.headers["X-Last-Seq"] = str(seq)
+    return resp
+
+def _json_response(fn, *args) -> JSONResponse:
+    return JSONResponse(jsonable_encoder(fn(*args)))
+
+def _series(line: PlantLine, last_seconds: int, format: str, bucket_seconds: Optional[float],
+            max_points: Optional[int], method: str):
+    raw_horizon = settings.RAW_RETENTION_HOURS * 3600
+    in_ring = _ring_covers(line.ring, last_seconds)
+    if bucket_seconds is None and max_points is None:
+        if in_ring:
+            ts, data = line.ring.window(last_seconds)
+            return line.ring.to_columns(ts, data) if format == "columns" else line.ring.to_rows(ts, data)
+        if last_seconds <= raw_horizon:
+            # window reaches past the live buffer: read the durable history
+            if format == "columns":
+                return recent_columns(engine, seconds=last_seconds, plant_id=line.id)
+            rows = recent_samples(engine, seconds=last_seconds, plant_id=line.id)
+            return [r._asdict() for r in rows]
+        # raw samples this old have been pruned: fall back to 1-minute buckets
+        bucket_seconds = 60.0
+
+    if method == "lttb":
+        n_out = max_points or max(3, int(last_seconds / bucket_seconds))
+        if in_ring:
+            ts, data = line.ring.window(last_seconds)
+        elif last_seconds / n_out < 60 and last_seconds <= raw_horizon:
+            ts, data = recent_arrays(engine, seconds=last_seconds, plant_id=line.id)
+        else:
+            # each output point spans a minute or more: thin the 1-minute means
+            b, _ = series_buckets(engine, line.ring, last_seconds, 60.0, plant_id=line.id)
+            ts, data = b["ts"], b["mean"]
+        idx = lttb_indices(ts, data, n_out)
+        ts, data = ts[idx], data[idx]
+        return line.ring.to_columns(ts, data) if format == "columns" else line.ring.to_rows(ts, data)
+
+    width = bucket_seconds or 0.0
+    if max_points:
+        # buckets are epoch-aligned, so the window can straddle one extra
+        width = max(width, last_seconds / (max_points - 1))
+    if in_ring:
+        b = bucketize(*line.ring.window(last_seconds), width)
+    elif width < 60 and last_seconds <= raw_horizon:
+        b = bucketize(*recent_arrays(engine, seconds=last_seconds, plant_id=line.id), width)
+    else:
+        b, width = series_buckets(engine, line.ring, last_seconds, width, plant_id=line.id)
+    return bucket_columns(b, line.ring.channels) if format == "columns" else bucket_rows(b, line.ring.channels)
+
+@router.get("/issues/latest")
+def issues_latest(line: PlantLine = Depends(get_line)):
+    return {"issue": line.detection.current, **line.detection.stats()}
+
+@router.get("/issues/stream")
+async def issues_stream(request: Request, since: int = Query(default=None, description="resume after this event id"),
+                        line: PlantLine = Depends(get_line)):
+    """
+    Server-sent events: one `issue` event per raised/changed/cleared transition.
+    A cursor ahead of the newest sample (its history was lost) gets one `reset`
+    event with the current issue, then the stream continues from now.
+    """
+    last_id = since
+    if last_id is None:
+        last_id = int(request.headers.get("last-event-id") or line.detection.event_id)
+
+    async def gen():
+        nonlocal last_id
+        if last_id > line.ring.seq:
+            last_id = line.detection.event_id
+            reset = {"event_id": last_id, "issue": line.detection.current}
+            yield f"id: {last_id}\nevent: reset\ndata: {json.dumps(jsonable_encoder(reset))}\n\n"
+        while not await request.is_disconnected():
+            for ev in line.detection.events_after(last_id):
+                last_id = ev["id"]
+                yield f"id: {ev['id']}\nevent: issue\ndata: {json.dumps(jsonable_encoder(ev))}\n\n"
+            try:
+                await line.detection.published.wait(last_id + 1, timeout=15)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+
+    return StreamingResponse(gen(), media_type="text/event-stream")
+
+def _sse_sample(seq: int, t: float, values, extra=None) -> str:
+    row = {"seq": seq, "ts": datetime.fromtimestamp(t, tz=timezone.utc).isoformat()}
+    row.update(zip(CHANNELS, values))
+    if extra:
+        row.update(extra)
+    return f"id: {seq}\nevent: sample\ndata: {json.dumps(row)}\n\n"
+
+@router.get("/state/stream")
+async def state_stream(request: Request,
+                       since: int = Query(default=None, description="resume after this sample seq"),
+                       max_backlog: int = Query(default=50, ge=1),
+                       lag: str = Query(default="drop", pattern="^(drop|merge)$"),
+                       line: PlantLine = Depends(get_line)):
+    """
+    Server-sent events, one `sample` event per new sample (event id = seq).
+
+    Each client only holds a cursor into the live buffer. A slow client's send
+    blocks its own generator; when it resumes with more than `max_backlog`
+    samples pending (or its cursor has fallen out of the buffer), it gets one
+    event instead: the newest sample (`lag=drop`) or the mean of the pending
+    ones (`lag=merge`), with the number of samples skipped/merged. A cursor
+    ahead of the newest sample (its history was lost) gets one `reset` event
+    with the current seq; the client should backfill again from there.
+    """
+    cursor = since
+    if cursor is None:
+        cursor = int(request.headers.get("last-event-id") or line.ring.seq)
+
+    async def gen():
+        nonlocal cursor
+        if cursor > line.ring.seq:
+            cursor = line.ring.seq
+            yield f"id: {cursor}\nevent: reset\ndata: {json.dumps({'seq': cursor})}\n\n"
+        while not await request.is_disconnected():
+            first, ts, data = line.ring.since(cursor)
+            n = len(ts)
+            if n:
+                last_seq = first + n - 1
+                if n > max_backlog or first > cursor + 1:
+                    skipped = last_seq - cursor - 1
+                    if lag == "merge":
+                        chunk = _sse_sample(last_seq, ts[-1], data.mean(axis=0).tolist(), {"merged": skipped + 1})
+                    else:
+                        chunk = _sse_sample(last_seq, ts[-1], data[-1].tolist(), {"dropped": skipped})
+                else:
+                    chunk = "".join(_sse_sample(first + i, t, vals) for i, (t, vals) in enumerate(zip(ts.tolist(), data.tolist())))
+                cursor = last_seq
+                yield chunk
+            try:
+                await line.ring.wait_for(cursor + 1, timeout=15)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+
+    return StreamingResponse(gen(), media_type="text/event-stream")
+
+@router.get("/config", response_model=ConfigGet)
+def get_config(line: PlantLine = Depends(get_line)):
     return {
         "targets": {"LSF_MIN": settings.LSF_MIN, "LSF_MAX": settings.LSF_MAX,
                     "BLAINE_MIN": settings.BLAINE_MIN, "BLAINE_MAX": settings.BLAINE_MAX,
@@ -49,103 +265,198 @@ def get_config():
         "limits": {"RAMP_LIMIT_PCT": settings.RAMP_LIMIT_PCT,
                    "SEP_RAMP_LIMIT": settings.SEP_RAMP_LIMIT,
                    "GYPSUM_RAMP_LIMIT": settings.GYPSUM_RAMP_LIMIT},
-        "knobs": Knobs(limestone_pct=plant.limestone_pct, sand_pct=plant.sand_pct, clay_pct=plant.clay_pct,
-                       separator_speed=plant.separator_speed, gypsum_pct=plant.gypsum_pct)
+        "knobs": Knobs(limestone_pct=line.plant.limestone_pct, sand_pct=line.plant.sand_pct, clay_pct=line.plant.clay_pct,
+                       separator_speed=line.plant.separator_speed, gypsum_pct=line.plant.gypsum_pct)
     }
 
-@app.post("/disturb")
-def disturb(d: DisturbanceRequest):
-    plant.inject_disturbance(d.type, d.magnitude, d.duration_s)
-    log_audit(engine, "disturbance", d.dict())
-    return {"ok": True}
+@router.post("/disturb")
+async def disturb(d: DisturbanceRequest, line: PlantLine = Depends(get_line)):
+    # shielded: a timeout must not cancel a command the simulator may still pick up
+    fut = asyncio.wrap_future(line.plant.submit_disturbance(d.type, d.magnitude, d.duration_s))
+    try:
+        seq = await asyncio.wait_for(asyncio.shield(fut), timeout=settings.APPLY_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        audit_writer.log("disturbance", {**d.dict(), "applied_seq": None, "timed_out": True}, plant_id=line.id)
+        raise HTTPException(504, "simulator did not pick up the disturbance in time; "
+                                 "it is still queued and may take effect when the simulator resumes")
+    audit_writer.log("disturbance", {**d.dict(), "applied_seq": seq}, plant_id=line.id)
+    return {"ok": True, "applied_seq": seq}
 
-@app.post("/plan/propose", response_model=Plan)
-def propose(force: bool = Query(default=False)):
-    rows = recent_samples(engine, seconds=120)
-    if len(rows) < 5:
+@router.post("/plan/propose", response_model=Plan)
+def propose(force: bool = Query(default=False),
+            mode: str = Query(default=None, pattern="^(local|llm|hybrid)$",
+                              description="local: optimizer only; llm: Gemini plans; hybrid: optimizer plans, Gemini explains"),
+            line: PlantLine = Depends(get_line)):
+    mode = mode or settings.PLANNER_MODE
+    ts, _ = line.ring.window(120)
+    if len(ts) < 5:
         raise HTTPException(503, "not enough data yet")
+    last = line.ring.latest()
 
-    # keep detector warm with recent rows
-    for r in rows:
-        detector.push(r.__dict__)
-
-    issue = detector.maybe_issue()
+    # the detection stage has already seen every sample; just read its verdict
+    issue = line.detection.current
     if not issue and not force:
         raise HTTPException(400, "no issue detected; try /disturb or use /plan/propose?force=1")
 
     if not issue:
         # fallback: build a generic issue based on current reading vs targets
-        r = rows[-1]
         text = "Proactive correction request (force): nudge rawmix/mill to center targets"
         kpi_hint = {"LSF":"neutral","Blaine":"neutral","fCaO":"neutral"}
         issue = {"text": text, "kpi_impact": kpi_hint, "drivers":["force"]}
 
     window_stats = {
-        "SiO2": {"last": rows[-1].SiO2_in},
-        "CaO":  {"last": rows[-1].CaO_in},
-        "Sep":  {"last": rows[-1].Separator},
-        "Moist":{"last": rows[-1].Moisture},
-        "Gypsum":{"last": rows[-1].Gypsum},
-        "LSF":  {"last": rows[-1].LSF_est},
-        "Blaine":{"last": rows[-1].Blaine_est},
-        "fCaO": {"last": rows[-1].fCaO_est},
+        "SiO2": {"last": last["SiO2_in"]},
+        "CaO":  {"last": last["CaO_in"]},
+        "Sep":  {"last": last["Separator"]},
+        "Moist":{"last": last["Moisture"]},
+        "Gypsum":{"last": last["Gypsum"]},
+        "LSF":  {"last": last["LSF_est"]},
+        "Blaine":{"last": last["Blaine_est"]},
+        "fCaO": {"last": last["fCaO_est"]},
         "kpi_impact_hint": issue["kpi_impact"]
     }
-    knobs = {"limestone_pct": plant.limestone_pct, "sand_pct": plant.sand_pct,
-             "clay_pct": plant.clay_pct, "separator_speed": plant.separator_speed,
-             "gypsum_pct": plant.gypsum_pct}
-    plan = propose_plan(window_stats, issue["text"], knobs)
-    log_audit(engine, "plan_proposed", {"issue": issue, "plan": plan.dict(), "force": bool(not detector.maybe_issue())})
+    knobs = {"limestone_pct": line.plant.limestone_pct, "sand_pct": line.plant.sand_pct,
+             "clay_pct": line.plant.clay_pct, "separator_speed": line.plant.separator_speed,
+             "gypsum_pct": line.plant.gypsum_pct}
+    key = line.plan_cache.key(mode, window_stats, issue["drivers"], knobs)
+    plan = line.plan_cache.get(key)
+    cached = plan is not None
+    if not cached:
+        if mode == "llm":
+            plan = propose_plan(window_stats, issue["text"], knobs)
+        else:
+            plan = propose_plan_local(last, issue["text"], knobs)
+            if mode == "hybrid":
+                plan = explain_plan(plan, window_stats, issue["text"], knobs)
+        # LLM failures come back as plans without actions; don't pin those
+        if plan.actions or mode == "local":
+            line.plan_cache.put(key, plan)
+    audit_writer.log("plan_proposed", {"issue": issue, "plan": plan.dict(), "mode": mode, "cached": cached,
+                                     "force": line.detection.current is None}, plant_id=line.id)
     return plan
 
-@app.post("/plan/simulate", response_model=PlanResult)
-def simulate(plan: Plan):
+@router.get("/plan/cache")
+def plan_cache_stats(line: PlantLine = Depends(get_line)):
+    return line.plan_cache.stats()
+
+@router.delete("/plan/cache")
+def plan_cache_clear(line: PlantLine = Depends(get_line)):
+    line.plan_cache.invalidate()
+    return line.plan_cache.stats()
+
+@router.post("/plan/simulate", response_model=PlanResult)
+def simulate(plan: Plan, line: PlantLine = Depends(get_line)):
     actions, clamp_note = clamp_actions(plan.actions)
-    rows = recent_samples(engine, seconds=10)
-    if not rows: raise HTTPException(503, "no data yet")
-    sample_now = rows[-1].__dict__
+    sample_now = line.ring.latest()
+    if sample_now is None: raise HTTPException(503, "no data yet")
     after = simulate_after(sample_now, actions)
-    log_audit(engine, "plan_simulated", {"plan": plan.dict(), "after": after, "clamp": clamp_note})
+    audit_writer.log("plan_simulated", {"plan": plan.dict(), "after": after, "clamp": clamp_note}, plant_id=line.id)
     return {"plan": plan, "adjusted_actions": actions, "safety_notes": clamp_note, "simulated_after": after}
 
-@app.post("/plan/apply", response_model=PlanResult)
-def apply(plan: Plan):
-    # Capture "before" state
-    rows_before = recent_samples(engine, seconds=10)
-    if not rows_before:
-        raise HTTPException(503, "no data yet to capture 'before' state")
-    before_state = rows_before[-1].__dict__
+@router.post("/plan/simulate-batch", response_model=PlanBatchResult)
+def simulate_batch(req: PlanBatchRequest, line: PlantLine = Depends(get_line)):
+    """Score many candidate action sets against the latest sample in one pass, best first."""
+    sample_now = line.ring.latest()
+    if sample_now is None: raise HTTPException(503, "no data yet")
+    n = len(req.candidates)
+    deltas, clamped = clamp_delta_matrix(n, KNOBS, *actions_to_arrays(req.candidates))
+    after = simulate_after_batch(sample_now, deltas)
+    score = band_distance(after)
+    order = np.argsort(score, kind="stable")[:req.top_k]
+    results = [{"index": int(i),
+                "adjusted_deltas": dict(zip(KNOBS, deltas[i].tolist())),
+                "simulated_after": {k: float(v[i]) for k, v in after.items()},
+                "score": float(score[i]),
+                "clamped": bool(clamped[i])} for i in order]
+    audit_writer.log("plan_batch_simulated", {"evaluated": n, "best": results[0] if results else None}, plant_id=line.id)
+    return {"evaluated": n, "results": results}
 
-    actions, clamp_note = clamp_actions(plan.actions)
-    plant.apply_actions(actions)
+@router.post("/plan/risk", response_model=RiskResult)
+async def plan_risk(req: RiskRequest, line: PlantLine = Depends(get_line)):
+    """
+    Monte Carlo band-violation risk of a plan over `horizon_s`: `replicas`
+    copies of the current plant state are stepped with the simulator's noise,
+    disturbance and clamp model, with and without the (clamped) actions. Both
+    runs use the same seed, so the difference is the plan's effect, not noise.
+    """
+    actions, clamp_note = clamp_actions(req.plan.actions)
+    seed = req.seed if req.seed is not None else int(np.random.SeedSequence().entropy % 2**32)
+    # snapshot on the event loop, between ticks; the stepping runs off it
+    with_plan, baseline = EnsembleSim(line.plant, req.replicas, seed), EnsembleSim(line.plant, req.replicas, seed)
+    ticks = max(1, int(round(req.horizon_s / settings.TICK_SECONDS)))
+    t0 = time.perf_counter()
+    plan_risk = await run_in_threadpool(band_risk, with_plan, ticks, actions)
+    base_risk = await run_in_threadpool(band_risk, baseline, ticks)
+    ms = (time.perf_counter() - t0) * 1000.0
+    audit_writer.log("plan_risk", {"plan": req.plan.dict(), "replicas": req.replicas, "horizon_s": req.horizon_s,
+                                   "seed": seed, "p_any": {k: v["p_any"] for k, v in plan_risk.items()}}, plant_id=line.id)
+    return {"adjusted_actions": actions, "safety_notes": clamp_note, "replicas": req.replicas,
+            "horizon_s": ticks * settings.TICK_SECONDS, "plan": plan_risk, "baseline": base_risk, "elapsed_ms": ms}
 
-    # Capture "after" state (after a short delay to allow simulator to tick)
-    import time
-    time.sleep(settings.TICK_SECONDS * 2) # Wait for a couple of ticks
-    rows_after = recent_samples(engine, seconds=10)
-    if not rows_after:
-        raise HTTPException(503, "no data yet to capture 'after' state")
-    after_state = rows_after[-1].__dict__
+@router.post("/plan/apply", response_model=PlanResult)
+async def apply(plan: Plan, line: PlantLine = Depends(get_line)):
+    # a line resumed from stored history has a non-zero seq but no samples until its first tick
+    if len(line.ring) == 0:
+        raise HTTPException(503, "no sample yet to capture 'before' state")
 
-    # Filter for float/int values for the response model to avoid validation errors
-    simulated_after_response = {k: v for k, v in after_state.items() if isinstance(v, (int, float))}
+    # The simulator applies queued actions at the next tick boundary and tells us
+    # which sample was the first produced with them.
+    actions, clamp_note = clamp_actions(plan.actions)
+    # shielded: a timeout must not cancel a command the simulator may still pick up
+    fut = asyncio.wrap_future(line.plant.submit_actions(actions))
+    try:
+        applied_seq = await asyncio.wait_for(asyncio.shield(fut), timeout=settings.APPLY_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        line.plan_cache.invalidate()  # the knobs may still move
+        audit_writer.log("plan_applied", {"plan": plan.dict(), "applied_actions": [a.dict() for a in actions],
+                                          "clamp": clamp_note, "timed_out": True}, plant_id=line.id)
+        raise HTTPException(504, "simulator did not pick up the actions in time; "
+                                 "they are still queued and may be applied when the simulator resumes")
+    line.plan_cache.invalidate()  # knobs moved; cached plans were computed for the old settings
+    seq_before = applied_seq - 1
+    before_state = line.ring.at(seq_before)
+    if before_state is None:
+        raise HTTPException(503, f"actions applied, but sample {seq_before} is no longer buffered to capture 'before' state")
 
-    # Filter for float/int values for the response model to avoid validation errors
-    simulated_after_response = {k: v for k, v in after_state.items() if isinstance(v, (int, float))}
+    # Wait (without holding a worker thread) for N samples produced under the new settings
+    seq_after = seq_before + settings.APPLY_SETTLE_TICKS
+    try:
+        await line.ring.wait_for(seq_after, timeout=settings.APPLY_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        raise HTTPException(504, f"simulator did not reach sample {seq_after} within {settings.APPLY_TIMEOUT_SECONDS}s")
+    after_state = line.ring.at(seq_after)
 
     # Filter for float/int values for the response model to avoid validation errors
     simulated_after_response = {k: v for k, v in after_state.items() if isinstance(v, (int, float))}
 
-    log_audit(engine, "plan_applied", {
+    kpis = ['LSF_est', 'Blaine_est', 'fCaO_est']
+    audit_writer.log("plan_applied", {
         "plan": plan.dict(),
         "applied_actions": [a.dict() for a in actions],
         "clamp": clamp_note,
-        "state_before": {k: v for k, v in before_state.items() if k in ['LSF_est', 'Blaine_est', 'fCaO_est'] and isinstance(v, (int, float))},
-        "state_after": {k: v for k, v in after_state.items() if k in ['LSF_est', 'Blaine_est', 'fCaO_est'] and isinstance(v, (int, float))}
-    })
+        "seq_before": seq_before,
+        "seq_after": seq_after,
+        "state_before": {k: before_state[k] for k in kpis},
+        "state_after": {k: after_state[k] for k in kpis}
+    }, plant_id=line.id)
     return {"plan": plan, "adjusted_actions": actions, "safety_notes": clamp_note, "simulated_after": simulated_after_response}
 
 @app.get("/audit")
-def audit(limit: int = 50):
-    rows = get_audits(engine, limit=limit)
-    return [{"ts": r.ts, "kind": r.kind, "detail": r.detail_json} for r in rows]
+async def audit(limit: int = Query(default=50, ge=1, le=1000),
+          before_id: int = Query(default=None, description="keyset cursor: continue after this entry id"),
+          kind: List[str] = Query(default=None), since: datetime = None, until: datetime = None,
+          plant_id: str = Query(default=None, description="only entries of this line"),
+          parse: bool = Query(default=False, description="return detail as JSON instead of a string")):
+    """Newest first. Page on by passing the last entry's id as `before_id`."""
+    await db_io.run(audit_writer.flush)   # read-your-writes for entries still in the queue
+    rows = await db_io.run(get_audits, engine, limit=limit, before_id=before_id, kinds=kind, since=since, until=until,
+                           plant_id=plant_id)
+    if not parse:
+        return [{"id": r.id, "ts": r.ts, "plant_id": r.plant_id, "kind": r.kind, "detail": r.detail_json} for r in rows]
+    # detail_json is already JSON: splice it in rather than parsing and re-encoding it
+    body = ",".join(f'{{"id":{r.id},"ts":{json.dumps(r.ts.isoformat())},"plant_id":{json.dumps(r.plant_id)},"kind":{json.dumps(r.kind)},"detail":{r.detail_json}}}'
+                    for r in rows)
+    return Response(f"[{body}]", media_type="application/json")
+
+app.include_router(router, prefix="/plants/{plant_id}")
+app.include_router(router)
@@ -1,7 +1,21 @@
-from typing import Dict
-from .kpi_model import compute_lsf, compute_blaine, compute_fcao
+import numpy as np
+from typing import Dict, Tuple
+from .kpi_model import (compute_lsf, compute_blaine, compute_fcao,
+                        compute_lsf_batch, compute_blaine_batch, compute_fcao_batch, compute_energy_batch)
 from .config import settings
 
+KNOBS = ["limestone_pct", "sand_pct", "clay_pct", "separator_speed", "gypsum_pct"]
+KNOB_INDEX = {k: i for i, k in enumerate(KNOBS)}
+# effect of a unit delta on each knob (rows, KNOBS order) on the model inputs
+# (cols: SiO2_in, CaO_in, Separator, Gypsum); same side-effects as simulate_after
+EFFECTS = np.array([
+    [-0.2, 0.4, 0.0, 0.0],   # limestone_pct
+    [-0.4, 0.0, 0.0, 0.0],   # sand_pct
+    [-0.1, 0.0, 0.0, 0.0],   # clay_pct
+    [ 0.0, 0.0, 1.0, 0.0],   # separator_speed
+    [ 0.0, 0.0, 0.0, 1.0],   # gypsum_pct
+])
+
 def simulate_after(sample_now: Dict, actions):
     # clone and apply rough effects (same as PlantSim side-effects)
     SiO2 = sample_now["SiO2_in"]
@@ -27,3 +41,39 @@ def simulate_after(sample_now: Dict, actions):
     Blaine = compute_blaine(Sep, Gyp, Moist)
     fCaO = compute_fcao(LSF, settings.LSF_MIN, settings.LSF_MAX)
     return {"LSF_est": LSF, "Blaine_est": Blaine, "fCaO_est": fCaO}
+
+def actions_to_arrays(candidates) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Flatten candidate action lists into parallel arrays (candidate row, knob
+    column, delta), one entry per action. Unknown knobs are ignored, as in
+    simulate_after.
+    """
+    rows, cols, deltas = [], [], []
+    for i, actions in enumerate(candidates):
+        for a in actions:
+            j = KNOB_INDEX.get(a.knob)
+            if j is not None:
+                rows.append(i); cols.append(j); deltas.append(a.delta_pct)
+    return np.array(rows, dtype=np.intp), np.array(cols, dtype=np.intp), np.array(deltas, dtype=np.float64)
+
+def simulate_after_batch(sample_now: Dict, deltas: np.ndarray) -> Dict[str, np.ndarray]:
+    """Vectorized simulate_after: one row of knob deltas (KNOBS order) per candidate."""
+    base = np.array([sample_now["SiO2_in"], sample_now["CaO_in"], sample_now["Separator"], sample_now["Gypsum"]])
+    x = base + deltas @ EFFECTS
+    LSF = compute_lsf_batch(x[:, 1], x[:, 0])
+    Blaine = compute_blaine_batch(x[:, 2], x[:, 3], sample_now["Moisture"])
+    fCaO = compute_fcao_batch(LSF, settings.LSF_MIN, settings.LSF_MAX)
+    energy = compute_energy_batch(x[:, 2], x[:, 3], x[:, 0])
+    return {"LSF_est": LSF, "Blaine_est": Blaine, "fCaO_est": fCaO, "energy_consumption": energy}
+
+def band_distance(after: Dict[str, np.ndarray]) -> np.ndarray:
+    """
+    Distance of each outcome from the target band centres, with LSF and Blaine
+    scaled by their band half-widths and fCaO (lower is better) by FCAO_MAX.
+    """
+    lsf_c = (settings.LSF_MIN + settings.LSF_MAX) / 2; lsf_h = (settings.LSF_MAX - settings.LSF_MIN) / 2
+    bl_c = (settings.BLAINE_MIN + settings.BLAINE_MAX) / 2; bl_h = (settings.BLAINE_MAX - settings.BLAINE_MIN) / 2
+    d_lsf = (after["LSF_est"] - lsf_c) / lsf_h
+    d_bl = (after["Blaine_est"] - bl_c) / bl_h
+    d_fc = after["fCaO_est"] / settings.FCAO_MAX
+    return np.sqrt(d_lsf ** 2 + d_bl ** 2 + d_fc ** 2)
@@ -0,0 +1,71 @@
+import numpy as np
+from typing import Sequence
+from .utils import RollingStats
+
+# EWMA: smoothing factor and control limit (in steady-state EWMA sigmas)
+EWMA_LAMBDA = 0.05
+EWMA_L = 3.0
+# two-sided CUSUM: slack and decision interval (in increment sigmas)
+CUSUM_K = 0.25
+CUSUM_H = 8.0
+# standardised increments are clipped here so one spike cannot trip an alarm
+CLIP_Z = 3.0
+
+class ChangePointEngine:
+    """
+    EWMA and two-sided CUSUM on the sample-to-sample increments of every channel.
+
+    The plant inputs wander like a random walk, so the level itself is not a
+    stable reference; its increments are. A drift shows up as a persistent
+    non-zero mean increment, which both statistics accumulate, while a lone
+    spike is clipped to CLIP_Z and decays. Increments are standardised by their
+    own rolling std and all state is updated in place, one vector step per sample.
+    """
+    def __init__(self, keys: Sequence[str], win: int, lam: float = EWMA_LAMBDA, L: float = EWMA_L,
+                 k: float = CUSUM_K, h: float = CUSUM_H):
+        self.keys = list(keys)
+        self.lam, self.L, self.k, self.h = lam, L, k, h
+        n = len(self.keys)
+        self.inc = RollingStats(self.keys, win, min_samples=10)
+        self.prev = None
+        self.ewma = np.zeros(n)
+        self.cusum_hi = np.zeros(n)
+        self.cusum_lo = np.zeros(n)
+        self._z = np.zeros(n)
+        self._tmp = np.zeros(n)
+        self.ewma_sigma = np.sqrt(lam / (2.0 - lam))
+        self.n = 0   # updates applied (0 while the increment stats warm up)
+
+    def update(self, x: np.ndarray):
+        if self.prev is None:
+            self.prev = np.array(x, dtype=np.float64)
+            return
+        z = self._z; tmp = self._tmp
+        np.subtract(x, self.prev, out=z)
+        self.prev[:] = x
+        ref = self.inc.stats_all()
+        self.inc.push_values(z)
+        if ref is None:
+            return
+        np.divide(z, ref["std"], out=z)
+        np.clip(z, -CLIP_Z, CLIP_Z, out=z)
+        # ewma = lam * z + (1 - lam) * ewma
+        self.ewma *= (1.0 - self.lam)
+        np.multiply(z, self.lam, out=tmp); self.ewma += tmp
+        # S+ = max(0, S+ + z - k);  S- = max(0, S- - z - k)
+        self.cusum_hi += z; self.cusum_hi -= self.k
+        np.maximum(self.cusum_hi, 0.0, out=self.cusum_hi)
+        self.cusum_lo -= z; self.cusum_lo -= self.k
+        np.maximum(self.cusum_lo, 0.0, out=self.cusum_lo)
+        self.n += 1
+
+    def ewma_z(self) -> np.ndarray:
+        """EWMA in units of its own steady-state sigma."""
+        return self.ewma / self.ewma_sigma
+
+    def alarms(self):
+        """Boolean vectors (up, down): EWMA beyond its limit or CUSUM beyond h."""
+        ez = self.ewma_z()
+        up = (ez > self.L) | (self.cusum_hi > self.h)
+        down = (ez < -self.L) | (self.cusum_lo > self.h)
+        return up, down
@@ -0,0 +1,91 @@
+import asyncio, time
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+from .config import settings
+
+# realtime: one tick per TICK_SECONDS of wall time; accelerated: SIM_SPEED times
+# faster; fast: no pacing at all, only a yield to the event loop between ticks
+MODES = ("realtime", "accelerated", "fast")
+# a paced loop that falls this far behind (wall seconds) stops trying to catch up
+MAX_LAG_SECONDS = 1.0
+
+def _as_epoch(ts: datetime) -> float:
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return ts.timestamp()
+
+class SimClock:
+    """
+    Simulated plant time, advanced by exactly TICK_SECONDS per simulator tick.
+
+    Everything that needs the plant's "now" (sample and issue timestamps,
+    series windows, retention, audit entries, plan-cache TTLs) reads this
+    clock, so a run produces the same data whether it is paced in real time,
+    accelerated or unpaced; wall time is only used for pacing and I/O batching.
+    Sim time is `start + ticks * tick_s`, so it does not accumulate float error.
+    """
+    def __init__(self, mode: str = None, speed: float = None, start: Optional[datetime] = None,
+                 until: Optional[datetime] = None, tick_s: float = None):
+        self.tick_s = tick_s or settings.TICK_SECONDS
+        self.set_mode(mode or settings.SIM_CLOCK_MODE, speed or settings.SIM_SPEED)
+        start = start or settings.SIM_START
+        self._t0 = _as_epoch(start) if start else time.time()
+        until = until or settings.SIM_UNTIL
+        self.until = _as_epoch(until) if until else None
+        self.ticks = 0
+        self.late_ticks = 0
+
+    def set_mode(self, mode: str, speed: float = 1.0):
+        if mode not in MODES:
+            raise ValueError(f"unknown clock mode {mode!r}; expected one of {MODES}")
+        if speed <= 0:
+            raise ValueError("speed must be positive")
+        self.mode = mode
+        self.speed = 1.0 if mode == "realtime" else float(speed)
+        self._deadline = None
+        # effective speed is measured from here
+        self._wall0 = self._wall_last = time.perf_counter()
+        self._ticks0 = getattr(self, "ticks", 0)
+
+    def epoch(self) -> float:
+        return self._t0 + self.ticks * self.tick_s
+
+    def now(self) -> datetime:
+        return datetime.fromtimestamp(self.epoch(), tz=timezone.utc)
+
+    def resume_after(self, ts: Optional[datetime]):
+        """Continue after restored history, so sample times keep increasing."""
+        if ts is not None and self.epoch() <= _as_epoch(ts):
+            self._t0 = _as_epoch(ts) - self.ticks * self.tick_s
+
+    def advance(self) -> datetime:
+        self.ticks += 1
+        self._wall_last = time.perf_counter()
+        return self.now()
+
+    def finished(self) -> bool:
+        return self.until is not None and self.epoch() >= self.until
+
+    async def sleep(self):
+        """Wait until the next tick is due in wall time (deadline-based, so work time does not add drift)."""
+        if self.mode == "fast":
+            await asyncio.sleep(0)
+            return
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        if self._deadline is None or now - self._deadline > MAX_LAG_SECONDS:
+            if self._deadline is not None:
+                self.late_ticks += 1
+            self._deadline = now
+        self._deadline += self.tick_s / self.speed
+        await asyncio.sleep(max(0.0, self._deadline - now))
+
+    def stats(self) -> Dict[str, Any]:
+        wall = self._wall_last - self._wall0
+        sim = (self.ticks - self._ticks0) * self.tick_s
+        return {"mode": self.mode, "speed": self.speed, "now": self.now(), "ticks": self.ticks,
+                "tick_s": self.tick_s, "until": datetime.fromtimestamp(self.until, tz=timezone.utc) if self.until else None,
+                "finished": self.finished(), "effective_speed": sim / wall if wall > 0 else 0.0,
+                "late_ticks": self.late_ticks}
+
+clock = SimClock()
@@ -1,5 +1,7 @@
 from pydantic_settings import BaseSettings
 from pydantic import Field, ConfigDict
+from datetime import datetime
+from typing import Optional
 
 class Settings(BaseSettings):
     GEMINI_API_KEY: str
@@ -9,6 +11,38 @@ class Settings(BaseSettings):
     TICK_SECONDS: float = 0.2 # Changed default to match .env.example
     WINDOW_SECONDS: int = 1800
 
+    # simulation clock: realtime | accelerated (SIM_SPEED x realtime) | fast (unpaced)
+    SIM_CLOCK_MODE: str = "realtime"
+    SIM_SPEED: float = 1.0
+    # optional replay window in simulated UTC time (default: start now, run forever);
+    # the simulator stops once the clock reaches SIM_UNTIL
+    SIM_START: Optional[datetime] = None
+    SIM_UNTIL: Optional[datetime] = None
+
+    # write-behind sample writer (group commit)
+    WRITE_BATCH_SIZE: int = 50
+    WRITE_MAX_AGE_SECONDS: float = 1.0
+    WRITE_QUEUE_MAX: int = 100_000
+
+    # production lines simulated and served by this process (comma-separated);
+    # the first one is also served on the unprefixed routes
+    PLANT_IDS: str = "default"
+
+    # threads (each with a pooled connection) serving database reads off the event loop
+    DB_IO_THREADS: int = 4
+
+    # in-memory live sample buffer per line (1 h at the default tick)
+    LIVE_BUFFER_SAMPLES: int = 18_000
+    # issue events kept for /issues/stream consumers
+    ISSUE_QUEUE_MAX: int = 1000
+
+    # tiered retention: raw samples, then 1-minute and 1-hour rollups (0 = keep forever)
+    RAW_RETENTION_HOURS: float = 48.0
+    ROLLUP_1M_RETENTION_DAYS: float = 30.0
+    ROLLUP_1H_RETENTION_DAYS: float = 0.0
+    RETENTION_INTERVAL_SECONDS: float = 30.0
+    RETENTION_DELETE_CHUNK: int = 5000
+
     # targets
     LSF_MIN: float = 98.0
     LSF_MAX: float = 102.0
@@ -16,6 +50,20 @@ class Settings(BaseSettings):
     BLAINE_MAX: float = 360.0
     FCAO_MAX: float = 1.0
 
+    # planner used by /plan/propose when no mode is given: llm | local | hybrid
+    PLANNER_MODE: str = "llm"
+    # proposed-plan cache
+    PLAN_CACHE_SIZE: int = 256
+    PLAN_CACHE_TTL_SECONDS: float = 120.0
+
+    # /plan/apply reports the state this many ticks after the actions took effect
+    APPLY_SETTLE_TICKS: int = 2
+    APPLY_TIMEOUT_SECONDS: float = 5.0
+
+    # /plan/risk work cap: replicas x ticks of the horizon, per ensemble (the
+    # endpoint runs two). ~3M replica-ticks take ~0.15 s on one core
+    RISK_MAX_REPLICA_TICKS: int = 3_000_000
+
     # ramp/guardrails
     RAMP_LIMIT_PCT: float = 0.5
     SEP_RAMP_LIMIT: float = 3.0
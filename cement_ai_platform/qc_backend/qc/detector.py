@@ -1,5 +1,8 @@
-from .utils import RollingStats, utcnow
+import numpy as np
+from .utils import RollingStats
+from .clock import clock
 from .config import settings
+from .changepoint import ChangePointEngine
 
 # Simple mapping of causes → KPI direction
 CAUSE_TO_KPI = {
@@ -12,13 +15,44 @@ CAUSE_TO_KPI = {
 
 Z_THRESH = 1.3
 
+MONITORED = ["SiO2_in","CaO_in","Moisture","Separator","Gypsum","LSF_est","Blaine_est","fCaO_est"]
+
+# (channel, direction) flagged by the EWMA/CUSUM engine → cause in CAUSE_TO_KPI
+CHANGEPOINT_CAUSES = {
+    ("SiO2_in", "up"): "SiO2_in_high",
+    ("CaO_in", "down"): "CaO_in_low",
+    ("Separator", "down"): "Separator_low",
+}
+
 class DriftDetector:
     def __init__(self, win=600):
-        self.rs = RollingStats(win, min_samples=10)
+        self.rs = RollingStats(MONITORED, win, min_samples=10)
+        self.cp = ChangePointEngine(MONITORED, win)
 
     def push(self, sample):
-        for k in ["SiO2_in","CaO_in","Moisture","Separator","Gypsum","LSF_est","Blaine_est","fCaO_est"]:
-            self.rs.push(k, sample[k])
+        self.push_values(np.fromiter((sample[k] for k in MONITORED), dtype=np.float64, count=len(MONITORED)))
+
+    def push_values(self, values):
+        """Push one sample given as a vector ordered like MONITORED."""
+        self.cp.update(values)
+        self.rs.push_values(values)
+
+    def _changepoint_drivers(self):
+        """Causes whose channel is flagged by EWMA/CUSUM, plus z-score hits the EWMA confirms."""
+        if self.cp.n == 0:
+            return set(), set()
+        up, down = self.cp.alarms()
+        ez = self.cp.ewma_z()
+        flagged, confirmed = set(), set()
+        for (k, dirn), cause in CHANGEPOINT_CAUSES.items():
+            i = MONITORED.index(k)
+            if (up if dirn == "up" else down)[i]:
+                flagged.add(cause)
+            # a z-score hit only counts while the channel is actually trending that way;
+            # a lone spike moves the increment EWMA by at most lam*CLIP_Z
+            if (ez[i] if dirn == "up" else -ez[i]) > Z_THRESH:
+                confirmed.add(cause)
+        return flagged, confirmed
 
     def maybe_issue(self):
         s_sio2 = self.rs.stats("SiO2_in")
@@ -31,19 +65,23 @@ class DriftDetector:
         drivers = []
         issue_text = None
         kpi_impact = {"LSF":"neutral","Blaine":"neutral","fCaO":"neutral"}
+        flagged, confirmed = self._changepoint_drivers()
 
-        # 1) z-score based (needs ~10 samples)
-        if s_sio2 and s_sio2["z"] > Z_THRESH and s_sio2["last"] > s_sio2["mean"]:
+        # 1) EWMA/CUSUM change points, and z-score (needs ~10 samples) when the EWMA agrees
+        if "SiO2_in_high" in flagged or (s_sio2 and s_sio2["z"] > Z_THRESH and s_sio2["last"] > s_sio2["mean"]
+                                         and "SiO2_in_high" in confirmed):
             issue_text = "SiO₂ spike detected; expect LSF down and f-CaO up"
             drivers.append("SiO2_in_high")
             kpi_impact.update(CAUSE_TO_KPI["SiO2_in_high"])
 
-        if s_cao and s_cao["z"] > Z_THRESH and s_cao["last"] < s_cao["mean"]:
+        if "CaO_in_low" in flagged or (s_cao and s_cao["z"] > Z_THRESH and s_cao["last"] < s_cao["mean"]
+                                       and "CaO_in_low" in confirmed):
             if not issue_text: issue_text = "CaO low drift detected; expect LSF down and f-CaO up"
             drivers.append("CaO_in_low")
             kpi_impact.update(CAUSE_TO_KPI["CaO_in_low"])
 
-        if s_sep and s_sep["z"] > Z_THRESH and s_sep["last"] < s_sep["mean"]:
+        if "Separator_low" in flagged or (s_sep and s_sep["z"] > Z_THRESH and s_sep["last"] < s_sep["mean"]
+                                          and "Separator_low" in confirmed):
             if not issue_text: issue_text = "Separator speed low; expect Blaine down"
             drivers.append("Separator_low")
             kpi_impact.update(CAUSE_TO_KPI["Separator_low"])
@@ -70,6 +108,6 @@ class DriftDetector:
             kpi_impact.update({"fCaO":"up", "LSF":"neutral"}) # fCaO high implies LSF is off target
 
         if issue_text and drivers:
-            return {"ts": utcnow(), "text": issue_text, "drivers": list(set(drivers)), "kpi_impact": kpi_impact}
+            return {"ts": clock.now(), "text": issue_text, "drivers": list(set(drivers)), "kpi_impact": kpi_impact}
 
         return None
@@ -0,0 +1,117 @@
+import numpy as np
+from datetime import datetime, timezone, timedelta
+from typing import Any, Dict, List, Sequence
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+def bucketize(ts: np.ndarray, data: np.ndarray, bucket_seconds: float) -> Dict[str, np.ndarray]:
+    """
+    Per-bucket count/min/max/mean/std/last of every channel over fixed,
+    epoch-aligned buckets: `ts` is sorted, so bucket boundaries are where the
+    bucket number changes and each statistic is a `ufunc.reduceat` over the
+    whole matrix. Empty buckets are simply absent. Returns `ts` (bucket start)
+    and the (n_buckets, channels) matrices; std is the population std.
+    """
+    if len(ts) == 0:
+        return _empty(data.shape[1])
+    b = np.floor(ts / bucket_seconds)
+    starts = np.flatnonzero(np.r_[True, b[1:] != b[:-1]])
+    ends = np.r_[starts[1:], len(ts)]
+    count = ends - starts
+    mean = np.add.reduceat(data, starts, axis=0) / count[:, None]
+    dev = data - np.repeat(mean, count, axis=0)
+    return {"ts": b[starts] * bucket_seconds,
+            "count": count,
+            "min": np.minimum.reduceat(data, starts, axis=0),
+            "max": np.maximum.reduceat(data, starts, axis=0),
+            "mean": mean,
+            "std": np.sqrt(np.add.reduceat(dev * dev, starts, axis=0) / count[:, None]),
+            "last": data[ends - 1]}
+
+def _empty(channels: int) -> Dict[str, np.ndarray]:
+    z = np.zeros((0, channels))
+    return {"ts": np.zeros(0), "count": np.zeros(0, dtype=np.int64),
+            "min": z, "max": z, "mean": z, "std": z, "last": z}
+
+def concat_buckets(parts: Sequence[Dict[str, np.ndarray]]) -> Dict[str, np.ndarray]:
+    """Concatenate bucket dicts that are already in time order and do not overlap."""
+    return {k: np.concatenate([p[k] for p in parts]) for k in parts[0]}
+
+def merge_buckets(b: Dict[str, np.ndarray], bucket_seconds: float) -> Dict[str, np.ndarray]:
+    """
+    Re-aggregate buckets into coarser epoch-aligned ones (by bucket start):
+    counts add, min/max of the extremes, count-weighted mean, pooled std, and
+    the last bucket's `last`. Exact when `bucket_seconds` is a multiple of the
+    input width.
+    """
+    if len(b["ts"]) == 0:
+        return b
+    g = np.floor(b["ts"] / bucket_seconds)
+    starts = np.flatnonzero(np.r_[True, g[1:] != g[:-1]])
+    ends = np.r_[starts[1:], len(g)]
+    w = b["count"][:, None].astype(np.float64)
+    count = np.add.reduceat(b["count"], starts)
+    n = count[:, None].astype(np.float64)
+    mean = np.add.reduceat(b["mean"] * w, starts, axis=0) / n
+    ex2 = np.add.reduceat(w * (b["std"] ** 2 + b["mean"] ** 2), starts, axis=0) / n
+    return {"ts": g[starts] * bucket_seconds,
+            "count": count,
+            "min": np.minimum.reduceat(b["min"], starts, axis=0),
+            "max": np.maximum.reduceat(b["max"], starts, axis=0),
+            "mean": mean,
+            "std": np.sqrt(np.maximum(ex2 - mean * mean, 0.0)),
+            "last": b["last"][ends - 1]}
+
+def lttb_indices(ts: np.ndarray, data: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets over all channels at once.
+
+    Channels are scaled to their own range so none dominates, and the triangle
+    area of a candidate is summed over channels; one index set is picked for
+    every channel so rows stay aligned. First and last samples are always kept.
+    """
+    n = len(ts)
+    if n_out >= n:
+        return np.arange(n)
+    assert n_out >= 3, "LTTB needs room for both end points and one bucket"
+    lo, hi = data.min(axis=0), data.max(axis=0)
+    y = (data - lo) / np.where(hi > lo, hi - lo, 1.0)
+    x = ts - ts[0]
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    out = np.empty(n_out, dtype=np.int64)
+    out[0], out[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        s, e = edges[i], edges[i + 1]
+        # average point of the next bucket (or the last sample)
+        ns, ne = e, edges[i + 2] if i + 2 < len(edges) else n
+        cx, cy = x[ns:ne].mean(), y[ns:ne].mean(axis=0)
+        ax, ay = x[a], y[a]
+        # |(ax - cx)(py - ay) - (ax - px)(cy - ay)| per channel, summed
+        area = np.abs((ax - cx) * (y[s:e] - ay) - (ax - x[s:e, None]) * (cy - ay)).sum(axis=1)
+        a = s + int(np.argmax(area))
+        out[i + 1] = a
+    return out
+
+def _iso(t: float) -> datetime:
+    return _EPOCH + timedelta(seconds=t)
+
+def bucket_rows(b: Dict[str, np.ndarray], channels: Sequence[str]) -> List[Dict[str, Any]]:
+    """One row per bucket: the mean under the channel name plus `<ch>_min/_max/_last`."""
+    out = []
+    mins, maxs, means, lasts = (b[k].tolist() for k in ("min", "max", "mean", "last"))
+    for j, (t, n) in enumerate(zip(b["ts"].tolist(), b["count"].tolist())):
+        row = {"ts": _iso(t), "count": n}
+        for i, c in enumerate(channels):
+            row[c] = means[j][i]
+            row[c + "_min"] = mins[j][i]; row[c + "_max"] = maxs[j][i]; row[c + "_last"] = lasts[j][i]
+        out.append(row)
+    return out
+
+def bucket_columns(b: Dict[str, np.ndarray], channels: Sequence[str]) -> Dict[str, list]:
+    out = {"ts": [_iso(t) for t in b["ts"].tolist()], "count": b["count"].tolist()}
+    for i, c in enumerate(channels):
+        out[c] = b["mean"][:, i].tolist()
+        for k in ("min", "max", "last"):
+            out[f"{c}_{k}"] = b[k][:, i].tolist()
+    return out
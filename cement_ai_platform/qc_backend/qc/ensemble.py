@@ -0,0 +1,91 @@
+import numpy as np
+from typing import Any, Dict, List, Optional
+from .config import settings
+from .kpi_model import compute_lsf_batch, compute_blaine_batch, compute_fcao_batch
+from .schemas import PlanAction
+from .simulator import PlantSim, NOISE, CLAMPS
+
+# KPIs whose band violations are reported, plus "any" (at least one of them)
+RISK_KPIS = ("LSF", "Blaine", "fCaO")
+# points in each p_by_time curve
+CURVE_POINTS = 30
+
+class EnsembleSim(PlantSim):
+    """
+    N replicas of a PlantSim stepped in lockstep.
+
+    The random-walking state (inputs, separator speed, gypsum) is an (n,)
+    array per variable and one tick is a handful of vector ops; the rawmix
+    knobs and the disturbance schedule are identical across replicas, so they
+    stay scalars and `apply_actions` / `inject_disturbance` / the disturbance
+    step are inherited unchanged from PlantSim. Only noise, clamping and the
+    KPI evaluation are vectorized.
+    """
+    def __init__(self, plant: PlantSim, n: int, seed: Optional[int] = None):
+        super().__init__()
+        self.n = n
+        self.rng = np.random.default_rng(seed)
+        self.limestone_pct, self.sand_pct, self.clay_pct = plant.limestone_pct, plant.sand_pct, plant.clay_pct
+        for k in NOISE:
+            setattr(self, k, np.full(n, float(getattr(plant, k))))
+        self._disturb = dict(plant._disturb)
+        self._disturb_timeleft = plant._disturb_timeleft
+        self.seq = plant.seq
+
+    def _add_noise(self):
+        for k, a in NOISE.items():
+            x = getattr(self, k)
+            x += self.rng.uniform(-a, a, self.n)
+
+    def _clamp(self):
+        for k, (lo, hi) in CLAMPS.items():
+            x = getattr(self, k)
+            np.clip(x, lo, hi, out=x)
+
+    def step(self) -> Dict[str, np.ndarray]:
+        """Advance every replica one tick; returns the KPI vectors."""
+        self.seq += 1
+        self._add_noise()
+        self._apply_disturbance()
+        self._clamp()
+        lsf = compute_lsf_batch(self.CaO_in, self.SiO2_in)
+        return {"LSF": lsf,
+                "Blaine": compute_blaine_batch(self.separator_speed, self.gypsum_pct, self.Moisture),
+                "fCaO": compute_fcao_batch(lsf, settings.LSF_MIN, settings.LSF_MAX)}
+
+def _violations(kpis: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    v = {"LSF": (kpis["LSF"] < settings.LSF_MIN) | (kpis["LSF"] > settings.LSF_MAX),
+         "Blaine": (kpis["Blaine"] < settings.BLAINE_MIN) | (kpis["Blaine"] > settings.BLAINE_MAX),
+         "fCaO": kpis["fCaO"] > settings.FCAO_MAX}
+    v["any"] = v["LSF"] | v["Blaine"] | v["fCaO"]
+    return v
+
+def band_risk(ens: EnsembleSim, ticks: int, actions: List[PlanAction] = ()) -> Dict[str, Dict[str, Any]]:
+    """
+    Apply `actions` at the first tick (as the live plant would) and run `ticks`
+    ticks. Per KPI: probability of any violation within the horizon, of being
+    out of band at the end, the expected fraction of time out of band, the
+    violation probability over time and quantiles of the final value.
+    """
+    if actions:
+        ens.apply_actions(actions)
+    keys = RISK_KPIS + ("any",)
+    ever = {k: np.zeros(ens.n, dtype=bool) for k in keys}
+    count = {k: np.zeros(ens.n, dtype=np.int64) for k in keys}
+    curve = {k: np.empty(ticks) for k in keys}
+    for t in range(ticks):
+        kpis = ens.step()
+        for k, v in _violations(kpis).items():
+            ever[k] |= v
+            count[k] += v
+            curve[k][t] = v.mean()
+    at = np.unique(np.linspace(0, ticks - 1, min(ticks, CURVE_POINTS)).astype(int))
+    out = {}
+    for k in keys:
+        out[k] = {"p_any": float(ever[k].mean()),
+                  "p_end": float(curve[k][-1]),
+                  "time_frac": float(count[k].mean() / ticks),
+                  "p_by_time": [[float((t + 1) * settings.TICK_SECONDS), float(curve[k][t])] for t in at],
+                  "final_quantiles": None if k == "any" else
+                      dict(zip(("p05", "p50", "p95"), np.quantile(kpis[k], [0.05, 0.5, 0.95]).tolist()))}
+    return out
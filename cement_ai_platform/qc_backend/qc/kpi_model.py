@@ -1,8 +1,64 @@
-import pandas as pd
+import warnings
+import numpy as np
 import joblib
 import os
 from .config import settings
 
+LSF_FEATURES = ['CaO_in', 'SiO2_in']
+BLAINE_FEATURES = ['Separator', 'Gypsum', 'Moisture']
+
+class CompiledKPI:
+    """
+    Evaluates a fitted regressor without building DataFrames.
+
+    Linear models (anything exposing a 1-D `coef_` and `intercept_`) are reduced
+    to coefficients at load time, reordered to our argument order via
+    `feature_names_in_`. One sample is then plain float arithmetic and a batch
+    is the same multiply-adds column by column, so both paths agree bit for bit
+    (and with sklearn's `predict` to ~1e-13). Other estimators get `predict`
+    on a NumPy matrix.
+    """
+    def __init__(self, features, model=None, coef=None, intercept=0.0):
+        self.features = list(features)
+        self.model = model
+        self.coef = None
+        if model is not None:
+            c = getattr(model, "coef_", None)
+            if c is not None and np.ndim(c) == 1 and hasattr(model, "intercept_"):
+                names = list(getattr(model, "feature_names_in_", self.features))
+                coef, intercept = np.asarray(c, dtype=np.float64)[[names.index(f) for f in self.features]], model.intercept_
+        if coef is not None:
+            self.coef = np.asarray(coef, dtype=np.float64)
+            self.intercept = float(intercept)
+            self._c = self.coef.tolist()
+
+    @property
+    def linear(self) -> bool:
+        return self.coef is not None
+
+    def __call__(self, *xs: float) -> float:
+        if self.linear:
+            acc = 0.0
+            for c, x in zip(self._c, xs):
+                acc += c * x
+            return acc + self.intercept
+        return float(self.batch(*[[x] for x in xs])[0])
+
+    def batch(self, *cols) -> np.ndarray:
+        if self.linear:
+            acc = np.zeros(np.broadcast(*cols).shape, dtype=np.float64)
+            for c, x in zip(self._c, cols):
+                acc += c * np.asarray(x, dtype=np.float64)
+            return acc + self.intercept
+        # broadcast like the linear path, so scalar columns (e.g. one Moisture
+        # for every candidate) are repeated rather than stacked as one row
+        cols = np.broadcast_arrays(*[np.asarray(c, dtype=np.float64) for c in cols])
+        X = np.column_stack([c.ravel() for c in cols])
+        with warnings.catch_warnings():
+            # fitted on a DataFrame; the column order is ours, so the name check is moot
+            warnings.filterwarnings("ignore", message="X does not have valid feature names")
+            return np.asarray(self.model.predict(X), dtype=np.float64).reshape(cols[0].shape)
+
 # --- Load Pre-trained Models ---
 # This part runs once when the module is loaded to load the pre-trained models.
 
@@ -21,21 +77,19 @@ if os.path.exists(settings.BLAINE_MODEL_PATH):
 else:
     print(f"WARNING: Blaine model not found at {settings.BLAINE_MODEL_PATH}. Please run 'python scripts/train_models.py'.")
 
+# Fallback to simple formulas if a model is not loaded:
+#   LSF    = 100 + 2.2 (CaO - 43) - 1.8 (SiO2 - 14)
+#   Blaine = 340 + 2.0 (Sep - 120) + 8.0 (Gyp - 3) - 4.0 (Moist - 1.5)
+lsf_kpi = (CompiledKPI(LSF_FEATURES, model=lsf_model) if lsf_model else
+           CompiledKPI(LSF_FEATURES, coef=[2.2, -1.8], intercept=100.0 - 2.2 * 43.0 + 1.8 * 14.0))
+blaine_kpi = (CompiledKPI(BLAINE_FEATURES, model=blaine_model) if blaine_model else
+              CompiledKPI(BLAINE_FEATURES, coef=[2.0, 8.0, -4.0], intercept=340.0 - 2.0 * 120.0 - 8.0 * 3.0 + 4.0 * 1.5))
+
 def compute_lsf(cao: float, sio2: float) -> float:
-    if lsf_model:
-        input_df = pd.DataFrame([[cao, sio2]], columns=['CaO_in', 'SiO2_in'])
-        return float(lsf_model.predict(input_df)[0])
-    else:
-        # Fallback to a simple formula if model is not loaded
-        return 100.0 + 2.2 * (cao - 43.0) - 1.8 * (sio2 - 14.0)
+    return lsf_kpi(cao, sio2)
 
 def compute_blaine(separator: float, gypsum_pct: float, moisture: float) -> float:
-    if blaine_model:
-        input_df = pd.DataFrame([[separator, gypsum_pct, moisture]], columns=['Separator', 'Gypsum', 'Moisture'])
-        return float(blaine_model.predict(input_df)[0])
-    else:
-        # Fallback to a simple formula if model is not loaded
-        return 340.0 + 2.0 * (separator - 120.0) + 8.0 * (gypsum_pct - 3.0) - 4.0 * (moisture - 1.5)
+    return blaine_kpi(separator, gypsum_pct, moisture)
 
 def compute_fcao(lsf: float, lsf_min: float, lsf_max: float) -> float:
     # Softer penalty: modest deviations give <1.0%; large deviations don't explode.
@@ -47,4 +101,22 @@ def compute_fcao(lsf: float, lsf_min: float, lsf_max: float) -> float:
         dev = 0.0
     return max(0.0, 0.25 * dev)
 
+def compute_energy(separator: float, gypsum_pct: float, sio2: float) -> float:
+    # simple model: mill load plus penalty for off-nominal raw mix
+    return (separator * 0.1) + (gypsum_pct * 5) + (abs(sio2 - 14.0) * 2)
+
+def compute_lsf_batch(cao, sio2) -> np.ndarray:
+    return lsf_kpi.batch(cao, sio2)
+
+def compute_blaine_batch(separator, gypsum_pct, moisture) -> np.ndarray:
+    return blaine_kpi.batch(separator, gypsum_pct, moisture)
+
+def compute_fcao_batch(lsf, lsf_min: float, lsf_max: float) -> np.ndarray:
+    lsf = np.asarray(lsf, dtype=np.float64)
+    dev = np.maximum(lsf_min - lsf, 0.0) + np.maximum(lsf - lsf_max, 0.0)
+    return 0.25 * dev
+
+def compute_energy_batch(separator, gypsum_pct, sio2) -> np.ndarray:
+    return (np.asarray(separator) * 0.1) + (np.asarray(gypsum_pct) * 5) + (np.abs(np.asarray(sio2) - 14.0) * 2)
+
 print("KPI models initialized (loading from disk if available).")
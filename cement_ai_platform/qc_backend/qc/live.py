@@ -0,0 +1,163 @@
+import asyncio
+import numpy as np
+from typing import Dict, List, Optional, Tuple, Any
+from datetime import datetime, timezone, timedelta
+from .clock import clock
+
+# numeric columns of a Sample, in schema order
+CHANNELS = ("SiO2_in", "CaO_in", "Moisture", "Separator", "Gypsum",
+            "LSF_est", "Blaine_est", "fCaO_est", "energy_consumption")
+
+def _epoch(ts: datetime) -> float:
+    # DB rows come back naive; everything we store is UTC
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return ts.timestamp()
+
+class SeqWaiters:
+    """
+    Lets coroutines await a monotonically increasing sequence number.
+    `notify` must be called from the event loop thread.
+    """
+    def __init__(self):
+        self.seq = 0
+        self._waiters: List[Tuple[int, asyncio.Future]] = []
+
+    def notify(self, seq: int):
+        self.seq = seq
+        if not self._waiters:
+            return
+        pending = []
+        for target, fut in self._waiters:
+            if fut.done():
+                continue
+            if target <= seq:
+                fut.set_result(seq)
+            else:
+                pending.append((target, fut))
+        self._waiters = pending
+
+    async def wait(self, seq: int, timeout: Optional[float] = None) -> int:
+        """Wait until the sequence reaches `seq`; raises asyncio.TimeoutError."""
+        if self.seq >= seq:
+            return self.seq
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.append((seq, fut))
+        return await asyncio.wait_for(fut, timeout)
+
+class SampleRing:
+    """
+    Fixed-capacity columnar ring buffer of live samples.
+
+    Every slot is written twice (at `i` and `i + capacity`), so the newest `n`
+    samples are always one contiguous slice and `tail`/`window`/`since` return
+    NumPy views without copying. A view stays valid until the writer wraps onto
+    it, i.e. for `capacity - n` further appends; copy it if it must outlive that.
+
+    Samples are numbered by `seq`, starting at 1 for the first append unless
+    `resume` continued an earlier numbering.
+    """
+    def __init__(self, capacity: int, channels=CHANNELS):
+        self.capacity = int(capacity)
+        self.channels = tuple(channels)
+        self._data = np.zeros((2 * self.capacity, len(self.channels)), dtype=np.float64)
+        self._ts = np.zeros(2 * self.capacity, dtype=np.float64)
+        self.seq = 0  # seq of the newest sample; 0 when empty
+        self.base = 0  # seq before the first sample this ring ever held
+        self.ticks = SeqWaiters()
+
+    def __len__(self):
+        return min(self.seq - self.base, self.capacity)
+
+    def resume(self, seq: int):
+        """Number the next append `seq + 1`, e.g. to continue a previous run's numbering. Empty ring only."""
+        if self.seq != self.base:
+            raise ValueError("resume() needs an empty ring")
+        self.seq = self.base = max(0, int(seq))
+        self.ticks.notify(self.seq)
+
+    def append(self, sample: Dict[str, Any]) -> int:
+        p = self.seq % self.capacity
+        row = [sample[c] for c in self.channels]
+        t = _epoch(sample["ts"])
+        self._data[p] = row; self._data[p + self.capacity] = row
+        self._ts[p] = t; self._ts[p + self.capacity] = t
+        self.seq += 1  # publish only after the slot is fully written
+        self.ticks.notify(self.seq)
+        return self.seq
+
+    def extend(self, samples):
+        for s in samples:
+            self.append(s)
+
+    def _slice(self, n: int) -> slice:
+        end = (self.seq - 1) % self.capacity + self.capacity + 1
+        return slice(end - n, end)
+
+    def tail(self, n: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Views over the newest `n` samples: (ts_epoch[n], data[n, channels])."""
+        n = max(0, min(int(n), len(self)))
+        if n == 0:
+            return self._ts[:0], self._data[:0]
+        sl = self._slice(n)
+        return self._ts[sl], self._data[sl]
+
+    def latest(self) -> Optional[Dict[str, Any]]:
+        if len(self) == 0:
+            return None
+        ts, data = self.tail(1)
+        return self.to_rows(ts, data)[0]
+
+    def at(self, seq: int) -> Optional[Dict[str, Any]]:
+        """The sample numbered `seq`, or None if it is not (or no longer) buffered."""
+        if seq > self.seq or seq <= self.seq - len(self):
+            return None
+        ts, data = self.tail(self.seq - seq + 1)
+        return self.to_rows(ts[:1], data[:1])[0]
+
+    def covers(self, seconds: float, now: Optional[datetime] = None) -> bool:
+        """True if no sample of the last `seconds` has been overwritten yet."""
+        if len(self) < self.capacity:
+            return True
+        ts, _ = self.tail(self.capacity)
+        return ts[0] <= _epoch(now or clock.now()) - seconds
+
+    def window(self, seconds: float, now: Optional[datetime] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Views over samples with `ts >= now - seconds`, oldest first."""
+        since = _epoch(now or clock.now()) - seconds
+        ts, data = self.tail(len(self))
+        i = int(np.searchsorted(ts, since, side="left"))
+        return ts[i:], data[i:]
+
+    def since(self, seq: int) -> Tuple[int, np.ndarray, np.ndarray]:
+        """
+        Views over samples with sequence number > `seq`, plus the seq of the
+        first returned sample. Samples already overwritten are skipped, so the
+        returned first seq can be larger than `seq + 1`.
+        """
+        n = min(self.seq - max(0, int(seq)), len(self))
+        ts, data = self.tail(n)
+        return self.seq - len(ts) + 1, ts, data
+
+    async def wait_for(self, seq: int, timeout: Optional[float] = None) -> int:
+        """Wait until sample `seq` has been appended."""
+        return await self.ticks.wait(seq, timeout)
+
+    def column(self, data: np.ndarray, name: str) -> np.ndarray:
+        return data[:, self.channels.index(name)]
+
+    def to_rows(self, ts: np.ndarray, data: np.ndarray) -> List[Dict[str, Any]]:
+        epoch = datetime(1970, 1, 1, tzinfo=timezone.utc)
+        out = []
+        for t, vals in zip(ts.tolist(), data.tolist()):
+            row = {"ts": epoch + timedelta(seconds=t)}
+            row.update(zip(self.channels, vals))
+            out.append(row)
+        return out
+
+    def to_columns(self, ts: np.ndarray, data: np.ndarray) -> Dict[str, list]:
+        epoch = datetime(1970, 1, 1, tzinfo=timezone.utc)
+        out = {"ts": [epoch + timedelta(seconds=t) for t in ts.tolist()]}
+        for i, c in enumerate(self.channels):
+            out[c] = data[:, i].tolist()
+        return out
@@ -0,0 +1,72 @@
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, List, Optional
+import numpy as np
+from .config import settings
+from .detector import DriftDetector, MONITORED
+from .live import SampleRing, SeqWaiters
+
+class DetectionStage:
+    """
+    Drift detection as a stage of the simulator loop.
+
+    `step()` consumes every sample the ring has received since the last call,
+    exactly once, in sequence order, and runs the detector on each. An event is
+    emitted only when the set of drivers changes (raised / changed / cleared),
+    into a bounded queue that `/issues/stream` consumers read by event id. The
+    event id is the seq of the sample that triggered it (at most one event per
+    sample), so ids keep growing across restarts along with the ring's seqs.
+    """
+    def __init__(self, detector: DriftDetector, ring: SampleRing, maxlen: int = None):
+        self.detector = detector
+        self.ring = ring
+        self.cols = np.array([ring.channels.index(k) for k in MONITORED])
+        self.last_seq = 0       # seq of the last sample consumed
+        self.skipped = 0        # samples overwritten in the ring before we saw them
+        self.current: Optional[Dict[str, Any]] = None
+        self.events: Deque[Dict[str, Any]] = deque(maxlen=maxlen or settings.ISSUE_QUEUE_MAX)
+        self.event_id = 0       # id of the newest event
+        self.emitted = 0
+        self.published = SeqWaiters()
+
+    def step(self) -> int:
+        self.last_seq = max(self.last_seq, self.ring.base)  # numbering may resume past 0
+        first, ts, data = self.ring.since(self.last_seq)
+        if len(ts) == 0:
+            return 0
+        self.skipped += first - self.last_seq - 1
+        vals = data[:, self.cols]
+        for i in range(len(vals)):
+            self.detector.push_values(vals[i])
+            self._update(first + i, ts[i], self.detector.maybe_issue())
+        self.last_seq = first + len(ts) - 1
+        return len(ts)
+
+    def _update(self, seq: int, ts: float, issue: Optional[Dict[str, Any]]):
+        prev = set(self.current["drivers"]) if self.current else set()
+        now = set(issue["drivers"]) if issue else set()
+        if prev == now:
+            return
+        if issue:
+            # stamp with the sample that triggered it, not with when we looked
+            issue["ts"] = datetime.fromtimestamp(ts, tz=timezone.utc)
+            issue["seq"] = seq
+            self.current = issue
+            self._emit("raised" if not prev else "changed", issue)
+        else:
+            cleared = dict(self.current, seq=seq, ts=datetime.fromtimestamp(ts, tz=timezone.utc))
+            self.current = None
+            self._emit("cleared", cleared)
+
+    def _emit(self, state: str, issue: Dict[str, Any]):
+        self.event_id = issue["seq"]
+        self.emitted += 1
+        self.events.append({"id": self.event_id, "state": state, **issue})
+        self.published.notify(self.event_id)
+
+    def events_after(self, event_id: int) -> List[Dict[str, Any]]:
+        return [e for e in self.events if e["id"] > event_id]
+
+    def stats(self) -> Dict[str, Any]:
+        return {"last_seq": self.last_seq, "skipped": self.skipped,
+                "events": self.emitted, "event_id": self.event_id, "queued": len(self.events)}
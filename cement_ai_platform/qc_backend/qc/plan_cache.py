@@ -0,0 +1,73 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional, Tuple
+from .config import settings
+from .schemas import Plan
+from .clock import clock
+
+# quantisation step per window_stats entry; states closer than this share a plan.
+# Roughly 1/16 of each target band, well above the simulator's per-tick noise.
+QUANTA = {"SiO2": 0.25, "CaO": 0.25, "Sep": 1.0, "Moist": 0.1, "Gypsum": 0.05,
+          "LSF": 0.25, "Blaine": 2.5, "fCaO": 0.05}
+# separator speed and gypsum also random-walk in the simulator, so they get coarser steps
+KNOB_QUANTA = {"limestone_pct": 0.05, "sand_pct": 0.05, "clay_pct": 0.05,
+               "separator_speed": 1.0, "gypsum_pct": 0.05}
+
+def _q(v: float, step: float) -> int:
+    return int(round(v / step))
+
+class PlanCache:
+    """
+    LRU + TTL cache of proposed plans keyed on a quantised fingerprint of the
+    plant state, the detected drivers and the knob settings. `invalidate()`
+    drops everything (called whenever knobs are changed).
+    """
+    def __init__(self, maxsize: int = None, ttl_s: float = None):
+        self.maxsize = maxsize or settings.PLAN_CACHE_SIZE
+        self.ttl_s = ttl_s if ttl_s is not None else settings.PLAN_CACHE_TTL_SECONDS
+        self._d: "OrderedDict[Tuple, Tuple[float, Plan]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.expired = self.evicted = self.invalidations = 0
+
+    def key(self, mode: str, window_stats: Dict[str, Any], drivers: Iterable[str], knobs: Dict[str, float]) -> Tuple:
+        state = tuple((k, _q(window_stats[k]["last"], q)) for k, q in QUANTA.items() if k in window_stats)
+        hint = tuple(sorted((window_stats.get("kpi_impact_hint") or {}).items()))
+        knob_fp = tuple((k, _q(v, KNOB_QUANTA.get(k, 0.01))) for k, v in sorted(knobs.items()))
+        return (mode, tuple(sorted(set(drivers))), hint, state, knob_fp)
+
+    def get(self, key: Tuple) -> Optional[Plan]:
+        now = clock.epoch()
+        with self._lock:
+            item = self._d.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            if now - item[0] > self.ttl_s:
+                del self._d[key]
+                self.expired += 1; self.misses += 1
+                return None
+            self._d.move_to_end(key)
+            self.hits += 1
+            return item[1].model_copy(deep=True)
+
+    def put(self, key: Tuple, plan: Plan):
+        with self._lock:
+            self._d[key] = (clock.epoch(), plan.model_copy(deep=True))
+            self._d.move_to_end(key)
+            while len(self._d) > self.maxsize:
+                self._d.popitem(last=False)
+                self.evicted += 1
+
+    def invalidate(self):
+        with self._lock:
+            self._d.clear()
+            self.invalidations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            size = len(self._d)
+        lookups = self.hits + self.misses
+        return {"size": size, "maxsize": self.maxsize, "ttl_s": self.ttl_s,
+                "hits": self.hits, "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "expired": self.expired, "evicted": self.evicted, "invalidations": self.invalidations}
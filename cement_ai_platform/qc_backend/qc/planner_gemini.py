@@ -42,7 +42,8 @@ OPERATIONAL CONSTRAINTS (Ramp Limits per step):
 - **Crucial**: Ensure limestone_pct + sand_pct + clay_pct always sums to approximately 100%. If your actions cause a deviation, explain how it will be balanced (e.g., by adjusting clay_pct).
 """
 
-def _extract_json(text: str) -> Dict[str, Any]:
+def _extract_json(text: str, strict: bool = False) -> Dict[str, Any]:
+    # strict: raise on undecodable JSON instead of returning an error plan
     # Try to find a JSON block, potentially wrapped in markdown code fences
     m = re.search(r"```json\s*(\{.*\})\s*```", text, flags=re.DOTALL)
     if m:
@@ -55,6 +56,8 @@ def _extract_json(text: str) -> Dict[str, Any]:
     try:
         return json.loads(payload)
     except json.JSONDecodeError as e:
+        if strict:
+            raise
         print(f"Error decoding JSON: {e}")
         print(f"Problematic payload: {payload}")
         # Return a more informative error message
@@ -105,3 +108,56 @@ def propose_plan(window_stats: Dict[str, Any], issue_text: str, knobs: Dict[str,
         print(f"An unexpected error occurred during plan generation: {e}")
         # Return a default plan for any other unexpected errors
         return Plan(issue="Plan Generation Error", kpi_impact={}, actions=[], notes=f"An unexpected error occurred: {e}")
+
+
+EXPLAIN_TMPL = """
+You are an expert cement quality control assistant. A deterministic optimizer has already chosen the corrective actions below; do NOT change them.
+Explain them for the plant operator.
+
+Targets: LSF {lsf_min} to {lsf_max}; Blaine {bl_min} to {bl_max}; fCaO below {fcao_max}.
+
+CURRENT PLANT STATE:
+- Window statistics: {window_stats}
+- Detected issue (if any): {issue_text}
+- Current knob settings: {knobs}
+
+CHOSEN PLAN: {plan}
+
+Return ONLY compact JSON:
+{{"issue": "string (one-line description of the problem)",
+  "reasons": {{"<knob>": "why this change helps"}},
+  "notes": "string (what to monitor next)"}}
+"""
+
+def explain_plan(plan: Plan, window_stats: Dict[str, Any], issue_text: str, knobs: Dict[str, float]) -> Plan:
+    """
+    Ask the LLM only for the wording of an already-chosen plan. The actions and
+    deltas are kept as given; on any error the plan is returned unchanged.
+    """
+    try:
+        genai.configure(api_key=settings.GEMINI_API_KEY)
+        prompt = EXPLAIN_TMPL.format(
+            lsf_min=settings.LSF_MIN, lsf_max=settings.LSF_MAX,
+            bl_min=settings.BLAINE_MIN, bl_max=settings.BLAINE_MAX,
+            fcao_max=settings.FCAO_MAX,
+            window_stats=json.dumps(window_stats, default=str)[:2000],
+            issue_text=issue_text,
+            knobs=json.dumps(knobs),
+            plan=json.dumps(plan.dict()),
+        )
+        model = genai.GenerativeModel("gemini-1.5-flash")
+        resp = model.generate_content(prompt)
+        text = _extract_json(resp.text.strip(), strict=True)
+        if not isinstance(text, dict):
+            raise ValueError(f"expected a JSON object, got {type(text).__name__}")
+    except Exception as e:
+        print(f"Plan explanation failed, keeping optimizer text: {e}")
+        return plan
+
+    reasons = text.get("reasons")
+    if not isinstance(reasons, dict):
+        reasons = {}
+    actions = [PlanAction(knob=a.knob, delta_pct=a.delta_pct, reason=reasons.get(a.knob) or a.reason)
+               for a in plan.actions]
+    notes = "; ".join(n for n in (text.get("notes"), plan.notes) if n)
+    return Plan(issue=text.get("issue") or plan.issue, kpi_impact=plan.kpi_impact, actions=actions, notes=notes)
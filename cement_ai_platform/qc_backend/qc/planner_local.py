@@ -0,0 +1,78 @@
+import time
+import numpy as np
+from typing import Any, Dict, Optional
+from .config import settings
+from .schemas import Plan, PlanAction
+from .actions import KNOBS, simulate_after_batch, band_distance
+
+# grid points per side of zero for each searched knob (clay is derived)
+GRID_STEPS = {"limestone_pct": 4, "sand_pct": 4, "separator_speed": 3, "gypsum_pct": 3}
+# objective = band_distance^2 + ENERGY_WEIGHT * energy + MOVE_WEIGHT * sum(|delta| / limit)
+ENERGY_WEIGHT = 0.01
+MOVE_WEIGHT = 0.02
+
+def _limits() -> Dict[str, float]:
+    return {"limestone_pct": settings.RAMP_LIMIT_PCT, "sand_pct": settings.RAMP_LIMIT_PCT,
+            "clay_pct": settings.RAMP_LIMIT_PCT, "separator_speed": settings.SEP_RAMP_LIMIT,
+            "gypsum_pct": settings.GYPSUM_RAMP_LIMIT}
+
+def candidate_grid() -> np.ndarray:
+    """
+    Every combination of grid deltas within the ramp limits, as an (n, KNOBS)
+    matrix. Clay takes minus the limestone+sand change so the rawmix keeps
+    summing to 100; combinations that would push clay past its own limit are dropped.
+    """
+    lim = _limits()
+    axes = [np.linspace(-lim[k], lim[k], 2 * GRID_STEPS[k] + 1) for k in GRID_STEPS]
+    mesh = np.meshgrid(*axes, indexing="ij")
+    cols = dict(zip(GRID_STEPS, (m.ravel() for m in mesh)))
+    cols["clay_pct"] = -(cols["limestone_pct"] + cols["sand_pct"])
+    deltas = np.column_stack([cols[k] for k in KNOBS])
+    return deltas[np.abs(cols["clay_pct"]) <= lim["clay_pct"] + 1e-9]
+
+_GRID: Optional[np.ndarray] = None
+
+def _direction(before: float, after: float, tol: float) -> str:
+    if after - before > tol: return "up"
+    if before - after > tol: return "down"
+    return "neutral"
+
+def propose_plan_local(sample_now: Dict[str, Any], issue_text: str, knobs: Dict[str, float]) -> Plan:
+    """Pick the grid candidate with the lowest objective; same Plan schema as the LLM planner."""
+    global _GRID
+    t0 = time.perf_counter()
+    if _GRID is None:
+        _GRID = candidate_grid()
+    deltas = _GRID
+    lim = np.array([_limits()[k] for k in KNOBS])
+
+    after = simulate_after_batch(sample_now, deltas)
+    dist = band_distance(after)
+    obj = dist ** 2 + ENERGY_WEIGHT * after["energy_consumption"] + MOVE_WEIGHT * (np.abs(deltas) / lim).sum(axis=1)
+    best = int(np.argmin(obj))
+    d = deltas[best]
+
+    now = simulate_after_batch(sample_now, np.zeros((1, len(KNOBS))))
+    before = {k: float(v[0]) for k, v in now.items()}
+    predicted = {k: float(v[best]) for k, v in after.items()}
+
+    actions = []
+    for k, dv in zip(KNOBS, d.tolist()):
+        if abs(dv) < 1e-9:
+            continue
+        if k == "clay_pct":
+            reason = "Balance rawmix so limestone+sand+clay stays at 100%"
+        elif k in ("separator_speed", "gypsum_pct"):
+            reason = f"Move Blaine {before['Blaine_est']:.1f} → {predicted['Blaine_est']:.1f} towards band centre"
+        else:
+            reason = f"Move LSF {before['LSF_est']:.2f} → {predicted['LSF_est']:.2f} towards band centre"
+        actions.append(PlanAction(knob=k, delta_pct=round(dv, 4), reason=reason))
+
+    kpi_impact = {"LSF": _direction(before["LSF_est"], predicted["LSF_est"], 0.05),
+                  "Blaine": _direction(before["Blaine_est"], predicted["Blaine_est"], 0.5),
+                  "fCaO": _direction(before["fCaO_est"], predicted["fCaO_est"], 0.01)}
+    ms = (time.perf_counter() - t0) * 1000.0
+    notes = (f"Local optimizer: {len(deltas)} candidates in {ms:.1f} ms; "
+             f"band distance {float(band_distance(now)[0]):.3f} → {float(dist[best]):.3f}, "
+             f"energy {before['energy_consumption']:.2f} → {predicted['energy_consumption']:.2f}")
+    return Plan(issue=issue_text, kpi_impact=kpi_impact, actions=actions, notes=notes)
@@ -0,0 +1,61 @@
+from typing import Dict, Iterable, Iterator, List, Optional
+from .config import settings
+from .simulator import PlantSim
+from .live import SampleRing
+from .detector import DriftDetector
+from .pipeline import DetectionStage
+from .plan_cache import PlanCache
+from .storage import last_sample_id, recent_samples
+
+class PlantLine:
+    """
+    Everything that is per production line: its simulator, live buffer, drift
+    detection stage and plan cache. The KPI models, the local planner's grid and
+    the sim clock are module-level and shared by every line.
+    """
+    def __init__(self, plant_id: str, ring_capacity: int = None):
+        self.id = plant_id
+        self.plant = PlantSim()
+        self.ring = SampleRing(ring_capacity or settings.LIVE_BUFFER_SAMPLES)
+        self.detector = DriftDetector(win=int(settings.WINDOW_SECONDS))
+        self.detection = DetectionStage(self.detector, self.ring)
+        self.plan_cache = PlanCache()
+        # run after every tick of this line, in order
+        self.stages = [self.detection]
+
+    def warm(self, engine):
+        """
+        Refill the live buffer from this line's durable history so windows survive
+        restarts. Numbering continues from the newest row id, so seqs (and the
+        detection event ids derived from them) never go backwards across restarts.
+        """
+        rows = recent_samples(engine, seconds=self.ring.capacity * settings.TICK_SECONDS, plant_id=self.id)
+        rows = rows[-self.ring.capacity:]
+        self.ring.resume(last_sample_id(engine, plant_id=self.id) - len(rows))
+        self.ring.extend(r._asdict() for r in rows)
+        for st in self.stages:
+            st.step()
+
+class PlantRegistry:
+    """The lines served by this process, in configuration order; the first is the default."""
+    def __init__(self, plant_ids: Iterable[str]):
+        self._lines: Dict[str, PlantLine] = {}
+        for pid in plant_ids:
+            pid = pid.strip()
+            if pid and pid not in self._lines:
+                self._lines[pid] = PlantLine(pid)
+        if not self._lines:
+            raise ValueError("at least one plant id is required")
+        self.default = next(iter(self._lines.values()))
+
+    def __iter__(self) -> Iterator[PlantLine]:
+        return iter(self._lines.values())
+
+    def __len__(self):
+        return len(self._lines)
+
+    def ids(self) -> List[str]:
+        return list(self._lines)
+
+    def get(self, plant_id: Optional[str]) -> Optional[PlantLine]:
+        return self.default if plant_id is None else self._lines.get(plant_id)
@@ -0,0 +1,243 @@
+import math, threading, time
+import numpy as np
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import Table, func, select as sa_select
+from .config import settings
+from .live import CHANNELS, SampleRing, _epoch
+from .downsample import bucketize, merge_buckets, concat_buckets
+from .storage import SampleORM, ROLLUP_1M, ROLLUP_1H, ROLLUP_STATS, DEFAULT_PLANT, sample_arrays
+from .clock import clock
+
+MINUTE, HOUR = 60.0, 3600.0
+# a minute is rolled up only once it is this old (sim time) and the sample writer has committed it
+SETTLE_SECONDS = 10.0
+# raw history is rolled up at most this much per read (bounds memory on a first run over old data)
+ROLLUP_CHUNK_SECONDS = 6 * HOUR
+
+_NAIVE_EPOCH = datetime(1970, 1, 1)
+
+def _dt(t: float) -> datetime:
+    # naive UTC, like every ts we store
+    return _NAIVE_EPOCH + timedelta(seconds=t)
+
+def _floor(t: float, width: float) -> float:
+    return math.floor(t / width) * width
+
+def _bucket_rows(b: Dict[str, np.ndarray], plant_id: str) -> List[Dict[str, Any]]:
+    stats = {k: b[k].tolist() for k in ROLLUP_STATS}
+    rows = []
+    for j, (t, n) in enumerate(zip(b["ts"].tolist(), b["count"].tolist())):
+        row = {"plant_id": plant_id, "bucket_ts": _dt(t), "count": n}
+        for k in ROLLUP_STATS:
+            row.update(zip((f"{c}_{k}" for c in CHANNELS), stats[k][j]))
+        rows.append(row)
+    return rows
+
+def read_rollup(engine, table: Table, since: float, until: Optional[float] = None,
+                plant_id: str = DEFAULT_PLANT) -> Dict[str, np.ndarray]:
+    """One line's rollup rows with `since <= bucket_ts < until` (epoch seconds) as a `bucketize`-style dict."""
+    cols = [table.c[f"{c}_{k}"] for k in ROLLUP_STATS for c in CHANNELS]
+    q = sa_select(table.c.bucket_ts, table.c.count, *cols).where(table.c.plant_id == plant_id,
+                                                                  table.c.bucket_ts >= _dt(since))
+    if until is not None:
+        q = q.where(table.c.bucket_ts < _dt(until))
+    with engine.connect() as conn:
+        rows = conn.execute(q.order_by(table.c.bucket_ts)).all()
+    n, nc = len(rows), len(CHANNELS)
+    vals = np.array([r[2:] for r in rows], dtype=np.float64).reshape(n, len(ROLLUP_STATS), nc)
+    out = {"ts": np.fromiter((_epoch(r[0]) for r in rows), dtype=np.float64, count=n),
+           "count": np.fromiter((r[1] for r in rows), dtype=np.int64, count=n)}
+    for i, k in enumerate(ROLLUP_STATS):
+        out[k] = vals[:, i, :]
+    return out
+
+def _watermark(conn, table: Table, width: float, plant_id: str) -> Optional[float]:
+    """End of the line's newest bucket in `table`, or None if it has none."""
+    last = conn.execute(sa_select(func.max(table.c.bucket_ts)).where(table.c.plant_id == plant_id)).scalar()
+    return _epoch(last) + width if last is not None else None
+
+def _first_ts(conn, table: Table, col, plant_id: str, after: Optional[float] = None) -> Optional[float]:
+    q = sa_select(func.min(col)).where(table.c.plant_id == plant_id)
+    if after is not None:
+        q = q.where(col >= _dt(after))
+    first = conn.execute(q).scalar()
+    return _epoch(first) if first is not None else None
+
+class RetentionWorker:
+    """
+    Background retention for the sample history.
+
+    Every `interval_s` it rolls newly closed minutes of raw samples into
+    `sample_rollup_1m`, newly closed hours of those into `sample_rollup_1h`,
+    then deletes raw samples older than RAW_RETENTION_HOURS (and 1-minute
+    rollups older than ROLLUP_1M_RETENTION_DAYS) in chunks of
+    RETENTION_DELETE_CHUNK rows, one short transaction each, so the sample
+    writer is never blocked for long. Rows are only deleted once the next tier
+    covers them. Everything is per line (`plant_ids()`), incremental from
+    that line's newest bucket in each table.
+    """
+    def __init__(self, engine, writer=None, plant_ids: Callable[[], Iterable[str]] = None,
+                 interval_s: float = None, chunk: int = None):
+        self.engine = engine
+        self.writer = writer   # minutes with rows still in its queue are not rolled up yet
+        self.plant_ids = plant_ids or (lambda: [DEFAULT_PLANT])
+        self.interval_s = interval_s or settings.RETENTION_INTERVAL_SECONDS
+        self.chunk = chunk or settings.RETENTION_DELETE_CHUNK
+        self._stop = threading.Event()
+        self._thread = None
+        # counters reported by stats()
+        self.runs = 0
+        self.errors = 0
+        self.rolled_1m = 0
+        self.rolled_1h = 0
+        self.deleted = {"raw": 0, "1m": 0, "1h": 0}
+        self.last_run_ms = 0.0
+        self.max_run_ms = 0.0
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="retention", daemon=True)
+            self._thread.start()
+
+    def close(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                self.errors += 1
+                print(f"Retention pass failed: {e}")
+            self._stop.wait(self.interval_s)
+
+    def run_once(self, now: Optional[datetime] = None):
+        t0 = time.perf_counter()
+        now_e = _epoch(now or clock.now())
+        for pid in list(self.plant_ids()):
+            self.rolled_1m += self.roll_minutes(now_e, pid)
+            self.rolled_1h += self.roll_hours(pid)
+            self.prune(now_e, pid)
+        ms = (time.perf_counter() - t0) * 1000.0
+        self.runs += 1
+        self.last_run_ms = ms
+        self.max_run_ms = max(self.max_run_ms, ms)
+
+    def roll_minutes(self, now_e: float, plant_id: str) -> int:
+        t = SampleORM.__table__
+        with self.engine.connect() as conn:
+            wm = _watermark(conn, ROLLUP_1M, MINUTE, plant_id)
+            if wm is None:
+                wm = _first_ts(conn, t, t.c.ts, plant_id)
+        if wm is None:
+            return 0
+        end = now_e - SETTLE_SECONDS
+        pending = self.writer.pending_since() if self.writer is not None else None
+        if pending is not None:
+            end = min(end, _epoch(pending))
+        wm, end = _floor(wm, MINUTE), _floor(end, MINUTE)
+        n = 0
+        while wm < end and not self._stop.is_set():
+            stop = min(end, wm + ROLLUP_CHUNK_SECONDS)
+            ts, data = sample_arrays(self.engine, _dt(wm), _dt(stop), plant_id=plant_id)
+            if len(ts):
+                rows = _bucket_rows(bucketize(ts, data, MINUTE), plant_id)
+                with self.engine.begin() as conn:
+                    conn.execute(ROLLUP_1M.insert(), rows)
+                n += len(rows)
+                wm = stop
+            else:
+                # skip straight over gaps in the history (plant or server down)
+                with self.engine.connect() as conn:
+                    nxt = _first_ts(conn, t, t.c.ts, plant_id, after=stop)
+                if nxt is None:
+                    break
+                wm = _floor(nxt, MINUTE)
+        return n
+
+    def roll_hours(self, plant_id: str) -> int:
+        with self.engine.connect() as conn:
+            end = _watermark(conn, ROLLUP_1M, MINUTE, plant_id)
+            wm = _watermark(conn, ROLLUP_1H, HOUR, plant_id)
+            if wm is None:
+                wm = _first_ts(conn, ROLLUP_1M, ROLLUP_1M.c.bucket_ts, plant_id)
+        if end is None or wm is None:
+            return 0
+        wm, end = _floor(wm, HOUR), _floor(end, HOUR)
+        if wm >= end:
+            return 0
+        b = read_rollup(self.engine, ROLLUP_1M, wm, end, plant_id=plant_id)
+        if len(b["ts"]) == 0:
+            return 0
+        rows = _bucket_rows(merge_buckets(b, HOUR), plant_id)
+        with self.engine.begin() as conn:
+            conn.execute(ROLLUP_1H.insert(), rows)
+        return len(rows)
+
+    def prune(self, now_e: float, plant_id: str):
+        with self.engine.connect() as conn:
+            wm_1m = _watermark(conn, ROLLUP_1M, MINUTE, plant_id)
+            wm_1h = _watermark(conn, ROLLUP_1H, HOUR, plant_id)
+        t = SampleORM.__table__
+        if wm_1m is not None:
+            cut = min(now_e - settings.RAW_RETENTION_HOURS * HOUR, wm_1m)
+            self.deleted["raw"] += self._delete_before(t, t.c.id, t.c.ts, cut, plant_id)
+        if wm_1h is not None and settings.ROLLUP_1M_RETENTION_DAYS > 0:
+            cut = min(now_e - settings.ROLLUP_1M_RETENTION_DAYS * 24 * HOUR, wm_1h)
+            self.deleted["1m"] += self._delete_before(ROLLUP_1M, ROLLUP_1M.c.bucket_ts, ROLLUP_1M.c.bucket_ts, cut, plant_id)
+        if settings.ROLLUP_1H_RETENTION_DAYS > 0:
+            cut = now_e - settings.ROLLUP_1H_RETENTION_DAYS * 24 * HOUR
+            self.deleted["1h"] += self._delete_before(ROLLUP_1H, ROLLUP_1H.c.bucket_ts, ROLLUP_1H.c.bucket_ts, cut, plant_id)
+
+    def _delete_before(self, table: Table, key, ts_col, cut: float, plant_id: str) -> int:
+        n = 0
+        mine = table.c.plant_id == plant_id
+        oldest = sa_select(key).where(mine, ts_col < _dt(cut)).order_by(ts_col).limit(self.chunk)
+        while not self._stop.is_set():
+            with self.engine.begin() as conn:
+                deleted = conn.execute(table.delete().where(mine, key.in_(oldest))).rowcount
+            n += deleted
+            if deleted < self.chunk:
+                break
+            time.sleep(0)   # let the sample writer in between chunks
+        return n
+
+    def stats(self) -> Dict[str, Any]:
+        return {"runs": self.runs, "errors": self.errors,
+                "rolled_1m": self.rolled_1m, "rolled_1h": self.rolled_1h,
+                "deleted": dict(self.deleted),
+                "last_run_ms": self.last_run_ms, "max_run_ms": self.max_run_ms}
+
+def series_buckets(engine, ring: SampleRing, seconds: float, width: float, now: Optional[datetime] = None,
+                   plant_id: str = DEFAULT_PLANT) -> Tuple[Dict[str, np.ndarray], float]:
+    """
+    Bucketed history of one line (whose live buffer is `ring`) for a long
+    window, read from the coarsest tier that fits: 1-hour rollups when `width`
+    is at least an hour, else 1-minute rollups, then newer 1-minute rollups and
+    finally raw samples (live ring or DB) for the part the rollups have not
+    caught up with yet. `width` is rounded up to a multiple of the base tier;
+    returns (buckets, width).
+    """
+    now_e = _epoch(now or clock.now())
+    base, res = (ROLLUP_1H, HOUR) if width >= HOUR else (ROLLUP_1M, MINUTE)
+    width = math.ceil(width / res) * res
+    cur = _floor(now_e - seconds, res)
+    tiers = [(ROLLUP_1H, HOUR), (ROLLUP_1M, MINUTE)] if base is ROLLUP_1H else [(ROLLUP_1M, MINUTE)]
+    parts = []
+    for table, tier_res in tiers:
+        b = read_rollup(engine, table, cur, plant_id=plant_id)
+        if len(b["ts"]):
+            parts.append(b)
+            cur = b["ts"][-1] + tier_res
+    if ring.covers(now_e - cur, now=now):
+        ts, data = ring.window(now_e - cur, now=now)
+    else:
+        ts, data = sample_arrays(engine, _dt(cur), plant_id=plant_id)
+    i = int(np.searchsorted(ts, cur, side="left"))
+    parts.append(bucketize(ts[i:], data[i:], MINUTE))
+    return merge_buckets(concat_buckets(parts), width), width
@@ -1,3 +1,4 @@
+import numpy as np
 from typing import List, Tuple
 from .schemas import PlanAction
 from .config import settings
@@ -34,3 +35,35 @@ def clamp_actions(actions: List[PlanAction]) -> Tuple[List[PlanAction], str]:
         reason="Auto-balance to keep limestone+sand+clay ≈ 100%"
     ))
     return out, "; ".join(notes) if notes else ""
+
+def knob_limits(knobs: List[str]) -> np.ndarray:
+    """Per-step ramp limit for each knob, in the given order."""
+    lim = {"separator_speed": settings.SEP_RAMP_LIMIT, "gypsum_pct": settings.GYPSUM_RAMP_LIMIT}
+    return np.array([settings.RAMP_LIMIT_PCT if k in RAW_KNOBS else lim.get(k, np.inf) for k in knobs])
+
+def clamp_delta_matrix(n: int, knobs: List[str], rows: np.ndarray, cols: np.ndarray,
+                       deltas: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Vectorized clamp_actions for `n` candidates at once.
+
+    Takes one entry per action (candidate row, knob column, delta), clips each
+    action to its knob's ramp limit, sums them into an (n, len(knobs)) delta
+    matrix and, like clamp_actions, sets clay to minus the rawmix total wherever
+    a candidate did not touch clay itself. Returns the matrix and a per-candidate
+    "something was clamped" flag.
+    """
+    lim = knob_limits(knobs)[cols]
+    clipped = np.clip(deltas, -lim, lim)
+    out = np.zeros((n, len(knobs)))
+    np.add.at(out, (rows, cols), clipped)
+    was_clamped = np.zeros(n, dtype=bool)
+    np.logical_or.at(was_clamped, rows, clipped != deltas)
+
+    raw = [knobs.index(k) for k in ("limestone_pct", "sand_pct", "clay_pct")]
+    clay = knobs.index("clay_pct")
+    has_clay = np.zeros(n, dtype=bool)
+    has_clay[rows[cols == clay]] = True
+    total = out[:, raw].sum(axis=1)
+    need = ~has_clay & (np.abs(total) > 1e-6)
+    out[need, clay] = -total[need]
+    return out, was_clamped
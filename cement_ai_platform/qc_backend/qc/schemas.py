@@ -1,6 +1,7 @@
-from pydantic import BaseModel, Field, ConfigDict
+from pydantic import BaseModel, Field, ConfigDict, model_validator
 from typing import List, Optional, Dict, Any
 from datetime import datetime
+from .config import settings
 
 class Sample(BaseModel):
     ts: datetime
@@ -44,6 +45,52 @@ class PlanResult(BaseModel):
     safety_notes: Optional[str] = None
     simulated_after: Optional[Dict[str, float]] = None
 
+class PlanBatchRequest(BaseModel):
+    candidates: List[List[PlanAction]]
+    top_k: Optional[int] = Field(default=None, ge=1)
+
+class PlanCandidateResult(BaseModel):
+    index: int
+    adjusted_deltas: Dict[str, float]
+    simulated_after: Dict[str, float]
+    score: float
+    clamped: bool
+
+class PlanBatchResult(BaseModel):
+    evaluated: int
+    results: List[PlanCandidateResult]
+
+class RiskRequest(BaseModel):
+    plan: Plan
+    horizon_s: float = Field(default=60.0, gt=0, le=600)
+    replicas: int = Field(default=2000, ge=1, le=5000)
+    seed: Optional[int] = None
+
+    @model_validator(mode="after")
+    def _bounded_work(self):
+        # keep one call well under a second: cap replicas x ticks, not just each factor
+        ticks = max(1, int(round(self.horizon_s / settings.TICK_SECONDS)))
+        if self.replicas * ticks > settings.RISK_MAX_REPLICA_TICKS:
+            raise ValueError(f"replicas x horizon ticks ({self.replicas} x {ticks}) exceeds "
+                             f"{settings.RISK_MAX_REPLICA_TICKS}; lower replicas or horizon_s")
+        return self
+
+class KPIRisk(BaseModel):
+    p_any: float                    # P(out of band at least once within the horizon)
+    p_end: float                    # P(out of band at the end of the horizon)
+    time_frac: float                # expected fraction of the horizon spent out of band
+    p_by_time: List[List[float]]    # [seconds ahead, P(out of band)]
+    final_quantiles: Optional[Dict[str, float]] = None
+
+class RiskResult(BaseModel):
+    adjusted_actions: List[PlanAction]
+    safety_notes: Optional[str] = None
+    replicas: int
+    horizon_s: float
+    plan: Dict[str, KPIRisk]
+    baseline: Dict[str, KPIRisk]    # same replicas and noise, no actions
+    elapsed_ms: float
+
 class DisturbanceRequest(BaseModel):
     type: str = Field(..., examples=["siO2_spike","cao_drop","sep_low"])
     magnitude: float = 1.0
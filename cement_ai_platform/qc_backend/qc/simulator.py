@@ -1,12 +1,23 @@
-import asyncio, random
-from typing import Dict
+import random
+from collections import deque
+from concurrent.futures import Future
+from typing import Dict, List
 from .config import settings
-from .kpi_model import compute_lsf, compute_blaine, compute_fcao
-from .utils import utcnow
-from .storage import add_sample, SampleORM, log_audit
+from .kpi_model import compute_lsf, compute_blaine, compute_fcao, compute_energy
+from .clock import SimClock, clock as sim_clock
+from .storage import SampleWriter
+from .schemas import PlanAction
+
+# per-tick uniform noise half-width and soft clamp range of each random-walking
+# state variable; qc.ensemble draws from the same model
+NOISE = {"SiO2_in": 0.05, "CaO_in": 0.05, "Moisture": 0.02, "separator_speed": 0.2, "gypsum_pct": 0.01}
+CLAMPS = {"SiO2_in": (10.0, 18.0), "CaO_in": (40.0, 46.0), "Moisture": (0.5, 3.0),
+          "separator_speed": (110.0, 130.0), "gypsum_pct": (2.0, 4.0)}
 
 class PlantSim:
-    def __init__(self):
+    def __init__(self, clock: SimClock = None):
+        # samples are stamped with simulated time; run_sim advances and paces it
+        self.clock = clock or sim_clock
         # baseline raw inputs (arbitrary but stable)
         self.SiO2_in = 14.0
         self.CaO_in = 43.0
@@ -20,6 +31,55 @@ class PlantSim:
         # active disturbances
         self._disturb_timeleft = 0
         self._disturb = {"dSiO2": 0.0, "dCaO": 0.0, "dSep": 0.0}
+        # sequence number of the last tick; run_sim aligns it with the ring
+        self.seq = 0
+        # commands from request handlers, applied at the next tick boundary
+        self._commands = deque()
+        self.commands_applied = 0
+        self.commands_cancelled = 0
+        self.max_batch = 0
+
+    def submit_actions(self, actions: List[PlanAction]) -> Future:
+        """
+        Queue knob changes for the next tick. Safe to call from any thread.
+        The future resolves to the seq of the first sample produced with them.
+        """
+        fut = Future()
+        self._commands.append(("actions", [(a.knob, a.delta_pct) for a in actions], fut))
+        return fut
+
+    def submit_disturbance(self, typ: str, mag: float, dur: int) -> Future:
+        fut = Future()
+        self._commands.append(("disturb", (typ, mag, dur), fut))
+        return fut
+
+    def _drain_commands(self):
+        # deque.popleft is atomic, so producers never need a lock
+        batch = []
+        while self._commands:
+            cmd = self._commands.popleft()
+            # a caller that cancelled its future no longer wants the command; once
+            # marked running the future can no longer be cancelled under us
+            if cmd[2].set_running_or_notify_cancel():
+                batch.append(cmd)
+            else:
+                self.commands_cancelled += 1
+        if not batch:
+            return
+        # coalesce knob deltas so the rawmix is rebalanced once per tick
+        deltas: Dict[str, float] = {}
+        for kind, payload, _ in batch:
+            if kind == "actions":
+                for knob, d in payload:
+                    deltas[knob] = deltas.get(knob, 0.0) + d
+            else:
+                self.inject_disturbance(*payload)
+        if deltas:
+            self.apply_actions([PlanAction(knob=k, delta_pct=d, reason="coalesced") for k, d in deltas.items()])
+        for _, _, fut in batch:
+            fut.set_result(self.seq)
+        self.commands_applied += len(batch)
+        self.max_batch = max(self.max_batch, len(batch))
 
     def apply_actions(self, actions):
         # apply small, safe steps (the safety module clamps these)
@@ -55,14 +115,12 @@ class PlantSim:
             self._disturb["dSep"] = -mag
         self._disturb_timeleft = max(self._disturb_timeleft, dur)
 
-    def tick(self) -> Dict:
+    def _add_noise(self):
         # random noise
-        self.SiO2_in += random.uniform(-0.05, 0.05)
-        self.CaO_in += random.uniform(-0.05, 0.05)
-        self.Moisture += random.uniform(-0.02, 0.02)
-        self.separator_speed += random.uniform(-0.2, 0.2)
-        self.gypsum_pct += random.uniform(-0.01, 0.01)
+        for k, a in NOISE.items():
+            setattr(self, k, getattr(self, k) + random.uniform(-a, a))
 
+    def _apply_disturbance(self):
         # apply disturbance transiently
         if self._disturb_timeleft > 0:
             self.SiO2_in += self._disturb["dSiO2"]
@@ -72,22 +130,28 @@ class PlantSim:
             if self._disturb_timeleft == 0:
                 self._disturb = {"dSiO2": 0.0, "dCaO": 0.0, "dSep": 0.0}
 
+    def _clamp(self):
         # soft clamps to keep ranges realistic
-        self.SiO2_in = max(10.0, min(18.0, self.SiO2_in))
-        self.CaO_in  = max(40.0, min(46.0, self.CaO_in))
-        self.Moisture = max(0.5, min(3.0, self.Moisture))
-        self.separator_speed = max(110.0, min(130.0, self.separator_speed))
-        self.gypsum_pct = max(2.0, min(4.0, self.gypsum_pct))
+        for k, (lo, hi) in CLAMPS.items():
+            setattr(self, k, max(lo, min(hi, getattr(self, k))))
+
+    def tick(self) -> Dict:
+        self.seq += 1
+        self._drain_commands()
+
+        self._add_noise()
+        self._apply_disturbance()
+        self._clamp()
 
         LSF = compute_lsf(self.CaO_in, self.SiO2_in)
         Blaine = compute_blaine(self.separator_speed, self.gypsum_pct, self.Moisture)
         fCaO = compute_fcao(LSF, settings.LSF_MIN, settings.LSF_MAX)
 
-        # Calculate energy consumption (simple model)
-        energy_consumption = (self.separator_speed * 0.1) + (self.gypsum_pct * 5) + (abs(self.SiO2_in - 14.0) * 2)
+        energy_consumption = compute_energy(self.separator_speed, self.gypsum_pct, self.SiO2_in)
 
         return {
-            "ts": utcnow(),
+            "seq": self.seq,
+            "ts": self.clock.now(),
             "SiO2_in": self.SiO2_in,
             "CaO_in": self.CaO_in,
             "Moisture": self.Moisture,
@@ -99,8 +163,23 @@ class PlantSim:
             "energy_consumption": energy_consumption,
         }
 
-async def run_sim(engine, plant: PlantSim):
-    while True:
-        d = plant.tick()
-        add_sample(engine, SampleORM(**d))
-        await asyncio.sleep(settings.TICK_SECONDS)
+async def run_sim(lines, writer: SampleWriter, clock: SimClock = None):
+    """
+    One scheduler for every line: each sim tick advances the shared clock once
+    and ticks every line's simulator in turn, so all lines share sim time and
+    the loop paces (and yields to the event loop) once per tick, not per line.
+    """
+    clock = clock or sim_clock
+    for line in lines:
+        line.plant.seq = line.ring.seq  # continue numbering after samples restored at startup
+    while not clock.finished():
+        clock.advance()  # the ticks below are stamped with the new sim time
+        for line in lines:
+            d = line.plant.tick()
+            d["plant_id"] = line.id
+            line.ring.append(d)  # readers are served from memory
+            writer.put(d)        # SQLite is only the durability sink
+            for st in line.stages:
+                st.step()        # downstream stages consume the ring by seq
+        await clock.sleep()
+    print(f"Simulation clock reached {clock.now().isoformat()}; simulator stopped after {clock.ticks} ticks.")
@@ -1,12 +1,24 @@
-from sqlmodel import SQLModel, Field, create_engine, Session, select
-from typing import Optional, Dict, Any
-from datetime import datetime
-from pydantic import BaseModel
-import json
+from sqlmodel import SQLModel, Field, create_engine
+from sqlalchemy import event, inspect, text, select as sa_select, tuple_, Table, Column, DateTime, Float, Integer, Index, String
+from typing import Optional, Dict, Any, Deque, List, Tuple
+from collections import deque
+from datetime import datetime, timedelta
+import asyncio, json, threading, time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from .config import settings
+from .clock import clock
+from .live import CHANNELS, _epoch
+
+# samples, rollups and audit entries are partitioned by production line
+DEFAULT_PLANT = "default"
 
 class SampleORM(SQLModel, table=True):
+    # (plant_id, ts) serves every per-line window query; ts alone the cross-line ones
+    __table_args__ = (Index("ix_sampleorm_plant_ts", "plant_id", "ts"),)
     id: Optional[int] = Field(default=None, primary_key=True)
-    ts: datetime
+    plant_id: str = Field(default=DEFAULT_PLANT)
+    ts: datetime = Field(index=True)
     SiO2_in: float
     CaO_in: float
     Moisture: float
@@ -18,39 +30,385 @@ class SampleORM(SQLModel, table=True):
     energy_consumption: float
 
 class AuditORM(SQLModel, table=True):
+    # (kind, ts) serves kind-filtered pages newest first; ts alone the unfiltered ones
+    __table_args__ = (Index("ix_auditorm_kind_ts", "kind", "ts"), Index("ix_auditorm_plant_ts", "plant_id", "ts"))
     id: Optional[int] = Field(default=None, primary_key=True)
-    ts: datetime
+    ts: datetime = Field(index=True)
+    plant_id: Optional[str] = None   # None for process-wide entries
     kind: str
     detail_json: str
 
+# 1-minute / 1-hour rollups of the sample history, one row per bucket with
+# count and <channel>_{mean,min,max,std,last}. Maintained by qc.retention.
+ROLLUP_STATS = ("mean", "min", "max", "std", "last")
+
+def _rollup_table(name: str) -> Table:
+    return Table(name, SQLModel.metadata,
+                 Column("plant_id", String, primary_key=True),
+                 Column("bucket_ts", DateTime, primary_key=True),
+                 Column("count", Integer, nullable=False),
+                 *[Column(f"{c}_{k}", Float, nullable=False) for c in CHANNELS for k in ROLLUP_STATS])
+
+ROLLUP_1M = _rollup_table("sample_rollup_1m")
+ROLLUP_1H = _rollup_table("sample_rollup_1h")
+
+# connections held by the background threads: sample writer, audit writer, retention
+BACKGROUND_CONNECTIONS = 3
+
 def init_engine(db_path: str):
-    engine = create_engine(f"sqlite:///{db_path}", echo=False)
+    # enough pooled connections for every I/O thread and background writer at once
+    engine = create_engine(f"sqlite:///{db_path}", echo=False,
+                           pool_size=settings.DB_IO_THREADS + BACKGROUND_CONNECTIONS, max_overflow=4)
+
+    @event.listens_for(engine, "connect")
+    def _sqlite_pragmas(dbapi_conn, _):
+        # WAL lets readers proceed while the sample writer commits; NORMAL sync
+        # only fsyncs at checkpoints, which is safe in WAL mode.
+        cur = dbapi_conn.cursor()
+        cur.execute("PRAGMA journal_mode=WAL")
+        cur.execute("PRAGMA synchronous=NORMAL")
+        cur.close()
+
     SQLModel.metadata.create_all(engine)
+    _add_plant_id(engine)
+    # create_all skips indexes on tables that already exist (older qc.db files)
+    for table in SQLModel.metadata.sorted_tables:
+        for idx in table.indexes:
+            idx.create(engine, checkfirst=True)
     return engine
 
-def add_sample(engine, s: SampleORM):
-    with Session(engine) as sess:
-        sess.add(s); sess.commit()
-
-def recent_samples(engine, seconds: int):
-    # quick and simple; in production add index + ts filter
-    with Session(engine) as sess:
-        q = select(SampleORM).order_by(SampleORM.ts.desc()).limit(seconds*2)
-        rows = list(reversed(sess.exec(q).all()))
-        return rows
-
-def log_audit(engine, kind: str, detail: Dict[str, Any]):
-    def convert_datetime_to_iso(obj):
-        if isinstance(obj, datetime):
-            return obj.isoformat()
-        raise TypeError(f"Object of type {obj.__class__.__name__} is not JSON serializable")
-
-    with Session(engine) as sess:
-        ao = AuditORM(ts=datetime.utcnow(), kind=kind, detail_json=json.dumps(detail, default=convert_datetime_to_iso))
-        sess.add(ao); sess.commit()
-
-def get_audits(engine, limit=100):
-    with Session(engine) as sess:
-        q = select(AuditORM).order_by(AuditORM.ts.desc()).limit(limit)
-        rows = sess.exec(q).all()
-        return rows
+def _add_plant_id(engine):
+    """Bring databases from before the plant_id partition key up to date; old rows belong to DEFAULT_PLANT."""
+    insp = inspect(engine)
+    with engine.begin() as conn:
+        for table in (SampleORM.__table__, AuditORM.__table__):
+            if "plant_id" not in {c["name"] for c in insp.get_columns(table.name)}:
+                default = f" NOT NULL DEFAULT '{DEFAULT_PLANT}'" if table is SampleORM.__table__ else ""
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN plant_id VARCHAR{default}"))
+                if table is AuditORM.__table__:
+                    conn.execute(text(f"UPDATE {table.name} SET plant_id = '{DEFAULT_PLANT}'"))
+        for table in (ROLLUP_1M, ROLLUP_1H):
+            # plant_id is part of the primary key, which SQLite cannot alter: rebuild
+            if "plant_id" not in {c["name"] for c in insp.get_columns(table.name)}:
+                old = f"{table.name}_old"
+                conn.execute(text(f"ALTER TABLE {table.name} RENAME TO {old}"))
+                table.create(conn)
+                cols = ", ".join(c.name for c in table.columns if c.name != "plant_id")
+                conn.execute(text(f"INSERT INTO {table.name} (plant_id, {cols}) SELECT '{DEFAULT_PLANT}', {cols} FROM {old}"))
+                conn.execute(text(f"DROP TABLE {old}"))
+
+SAMPLE_COLUMNS = [c.name for c in SampleORM.__table__.columns if c.name != "id"]
+
+class DBExecutor:
+    """
+    Dedicated thread pool for database reads issued from the event loop.
+
+    Handlers `await db_io.run(fn, *args)`: the call runs on one of `threads`
+    I/O threads, each with its own pooled connection, so neither the event
+    loop nor FastAPI's shared request threadpool ever waits on SQLite. Writes
+    already go through the write-behind writers' threads.
+    """
+    name = "db-io"
+
+    def __init__(self, threads: int = None):
+        self.threads = threads or settings.DB_IO_THREADS
+        self._pool = ThreadPoolExecutor(self.threads, thread_name_prefix=self.name)
+        self._lock = threading.Lock()
+        # counters reported by stats()
+        self.calls = 0
+        self.errors = 0
+        self.inflight = 0
+        self.max_wait_ms = 0.0
+        self.max_call_ms = 0.0
+        self._total_call_ms = 0.0
+
+    async def run(self, fn, *args, **kw):
+        queued = time.perf_counter()
+
+        def call():
+            t0 = time.perf_counter()
+            with self._lock:
+                self.inflight += 1
+                self.max_wait_ms = max(self.max_wait_ms, (t0 - queued) * 1000.0)
+            try:
+                return fn(*args, **kw)
+            except Exception:
+                with self._lock:
+                    self.errors += 1
+                raise
+            finally:
+                ms = (time.perf_counter() - t0) * 1000.0
+                with self._lock:
+                    self.inflight -= 1
+                    self.calls += 1
+                    self.max_call_ms = max(self.max_call_ms, ms)
+                    self._total_call_ms += ms
+
+        return await asyncio.get_running_loop().run_in_executor(self._pool, call)
+
+    def close(self):
+        self._pool.shutdown(wait=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"threads": self.threads, "calls": self.calls, "errors": self.errors, "inflight": self.inflight,
+                "max_wait_ms": self.max_wait_ms, "max_call_ms": self.max_call_ms,
+                "avg_call_ms": self._total_call_ms / self.calls if self.calls else 0.0}
+
+class SampleWriter:
+    """
+    Write-behind queue for simulator samples.
+
+    `put` only appends to an in-memory deque; a background thread group-commits
+    the pending rows in one transaction once `batch_size` rows are queued or the
+    oldest row is `max_age_s` old. `close` flushes whatever is left.
+    """
+    name = "sample-writer"
+    # a batch that fails to commit is dropped (samples are telemetry); AuditWriter keeps it
+    retry_failed = False
+    retry_backoff_s = 1.0
+
+    def __init__(self, engine, batch_size: int = None, max_age_s: float = None, max_queue: int = None):
+        self.engine = engine
+        self.table = SampleORM.__table__
+        self.columns = SAMPLE_COLUMNS
+        self.batch_size = batch_size or settings.WRITE_BATCH_SIZE
+        self.max_age_s = max_age_s if max_age_s is not None else settings.WRITE_MAX_AGE_SECONDS
+        self.max_queue = max_queue or settings.WRITE_QUEUE_MAX
+        self._q: Deque[tuple] = deque()
+        self._cv = threading.Condition()
+        self._thread = None
+        self._stop = False
+        self._inflight: List[datetime] = []   # oldest ts of each batch being written
+        # counters reported by stats()
+        self.written = 0
+        self.batches = 0
+        self.dropped = 0
+        self.errors = 0
+        self.retried = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self._total_flush_ms = 0.0
+
+    def start(self):
+        if self._thread is None:
+            self._stop = False
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def put(self, sample: Dict[str, Any]):
+        row = {c: sample[c] for c in self.columns}
+        with self._cv:
+            if len(self._q) >= self.max_queue:
+                # DB is not keeping up; shed the oldest row rather than grow without bound
+                self._q.popleft(); self.dropped += 1
+            self._q.append((time.monotonic(), row))
+            # wake the writer on the first row (to arm the age timer) and on a full batch
+            if len(self._q) == 1 or len(self._q) >= self.batch_size:
+                self._cv.notify()
+
+    def _run(self):
+        while True:
+            with self._cv:
+                while not self._stop:
+                    if len(self._q) >= self.batch_size:
+                        break
+                    if self._q:
+                        age = time.monotonic() - self._q[0][0]
+                        if age >= self.max_age_s:
+                            break
+                        self._cv.wait(self.max_age_s - age)
+                    else:
+                        self._cv.wait()
+                batch = self._take()
+                stop = self._stop
+            if batch and not self._write(batch) and not stop:
+                # back off before retrying the requeued rows (close() still wakes us)
+                with self._cv:
+                    if not self._stop:
+                        self._cv.wait(self.retry_backoff_s)
+            if stop:
+                return
+
+    def _take(self) -> List[Dict[str, Any]]:
+        # caller holds self._cv
+        batch = [row for _, row in self._q]
+        self._q.clear()
+        if batch:
+            self._inflight.append(batch[0]["ts"])
+        return batch
+
+    def _write(self, batch) -> bool:
+        t0 = time.perf_counter()
+        try:
+            with self.engine.begin() as conn:
+                conn.execute(self.table.insert(), batch)
+        except Exception as e:
+            self.errors += 1
+            if self.retry_failed:
+                self._requeue(batch)
+                print(f"{self.name} flush failed ({len(batch)} rows, will retry): {e}")
+            else:
+                print(f"{self.name} flush failed ({len(batch)} rows): {e}")
+            return False
+        finally:
+            with self._cv:
+                self._inflight.remove(batch[0]["ts"])
+        ms = (time.perf_counter() - t0) * 1000.0
+        self.written += len(batch); self.batches += 1
+        self.last_flush_ms = ms
+        self.max_flush_ms = max(self.max_flush_ms, ms)
+        self._total_flush_ms += ms
+        return True
+
+    def _requeue(self, batch):
+        # back to the head of the queue, in order, ahead of rows queued meanwhile
+        now = time.monotonic()
+        with self._cv:
+            self._q.extendleft((now, row) for row in reversed(batch))
+            while len(self._q) > self.max_queue:
+                self._q.popleft(); self.dropped += 1   # shed the oldest, as put() does
+            self.retried += len(batch)
+
+    def flush(self):
+        with self._cv:
+            batch = self._take()
+        if batch:
+            self._write(batch)
+
+    def close(self):
+        if self._thread is not None:
+            with self._cv:
+                self._stop = True
+                self._cv.notify()
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def pending_since(self) -> Optional[datetime]:
+        """ts of the oldest row not yet committed (queued or being written), or None."""
+        with self._cv:
+            pending = list(self._inflight)
+            if self._q:
+                pending.append(self._q[0][1]["ts"])
+        return min(pending) if pending else None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cv:
+            depth = len(self._q)
+            oldest = time.monotonic() - self._q[0][0] if self._q else 0.0
+        return {
+            "queue_depth": depth,
+            "oldest_pending_s": oldest,
+            "written": self.written,
+            "batches": self.batches,
+            "dropped": self.dropped,
+            "errors": self.errors,
+            "retried": self.retried,
+            "last_flush_ms": self.last_flush_ms,
+            "max_flush_ms": self.max_flush_ms,
+            "avg_flush_ms": self._total_flush_ms / self.batches if self.batches else 0.0,
+        }
+
+def last_sample_ts(engine, plant_id: Optional[str] = None) -> Optional[datetime]:
+    """Newest sample ts of one line, or of any line."""
+    t = SampleORM.__table__
+    q = sa_select(t.c.ts)
+    if plant_id is not None:
+        q = q.where(t.c.plant_id == plant_id)
+    with engine.connect() as conn:
+        return conn.execute(q.order_by(t.c.ts.desc()).limit(1)).scalar()
+
+def last_sample_id(engine, plant_id: str = DEFAULT_PLANT) -> int:
+    """Row id of one line's newest sample, 0 if none. Ids only grow, so they outlive restarts."""
+    t = SampleORM.__table__
+    q = sa_select(t.c.id).where(t.c.plant_id == plant_id).order_by(t.c.ts.desc()).limit(1)
+    with engine.connect() as conn:
+        return conn.execute(q).scalar() or 0
+
+def recent_samples(engine, seconds: float, now: Optional[datetime] = None, plant_id: str = DEFAULT_PLANT) -> List[Any]:
+    """
+    Samples of one line with `ts >= now - seconds`, oldest first, as lightweight
+    Core rows (named tuples: `r.LSF_est`, `r._asdict()`), never ORM instances.
+    """
+    t = SampleORM.__table__
+    since = (now or clock.now()) - timedelta(seconds=seconds)
+    q = sa_select(*[t.c[c] for c in SAMPLE_COLUMNS]).where(t.c.plant_id == plant_id, t.c.ts >= since).order_by(t.c.ts)
+    with engine.connect() as conn:
+        return conn.execute(q).all()
+
+def recent_columns(engine, seconds: float, now: Optional[datetime] = None, plant_id: str = DEFAULT_PLANT) -> Dict[str, list]:
+    """Same window as `recent_samples`, transposed to one list per column."""
+    rows = recent_samples(engine, seconds, now=now, plant_id=plant_id)
+    if not rows:
+        return {c: [] for c in SAMPLE_COLUMNS}
+    return {c: list(col) for c, col in zip(SAMPLE_COLUMNS, zip(*rows))}
+
+def sample_arrays(engine, since: datetime, until: Optional[datetime] = None,
+                  plant_id: str = DEFAULT_PLANT) -> Tuple[np.ndarray, np.ndarray]:
+    """Samples with `since <= ts < until` as (ts_epoch[n], data[n, CHANNELS]), like `SampleRing.window`."""
+    t = SampleORM.__table__
+    q = sa_select(t.c.ts, *[t.c[c] for c in CHANNELS]).where(t.c.plant_id == plant_id, t.c.ts >= since)
+    if until is not None:
+        q = q.where(t.c.ts < until)
+    with engine.connect() as conn:
+        rows = conn.execute(q.order_by(t.c.ts)).all()
+    ts = np.fromiter((_epoch(r[0]) for r in rows), dtype=np.float64, count=len(rows))
+    data = np.array([r[1:] for r in rows], dtype=np.float64).reshape(len(rows), len(CHANNELS))
+    return ts, data
+
+def recent_arrays(engine, seconds: float, now: Optional[datetime] = None,
+                  plant_id: str = DEFAULT_PLANT) -> Tuple[np.ndarray, np.ndarray]:
+    """Same window as `recent_samples`, as arrays (see `sample_arrays`)."""
+    return sample_arrays(engine, (now or clock.now()) - timedelta(seconds=seconds), plant_id=plant_id)
+
+def _json_default(obj):
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {obj.__class__.__name__} is not JSON serializable")
+
+class AuditWriter(SampleWriter):
+    """
+    The sample write-behind queue, for audit entries. `log` stamps and
+    serialises the entry on the caller's thread (so later mutation of `detail`
+    cannot leak in) and returns without touching the database.
+    """
+    name = "audit-writer"
+    # the audit trail must not lose entries to a transient DB error
+    retry_failed = True
+
+    def __init__(self, engine, **kw):
+        super().__init__(engine, **kw)
+        self.table = AuditORM.__table__
+        self.columns = ["ts", "plant_id", "kind", "detail_json"]
+
+    def log(self, kind: str, detail: Dict[str, Any], plant_id: Optional[str] = None):
+        self.put({"ts": clock.now(), "plant_id": plant_id, "kind": kind,
+                  "detail_json": json.dumps(detail, default=_json_default)})
+
+def get_audits(engine, limit=100, before_id: Optional[int] = None, kinds: Optional[List[str]] = None,
+               since: Optional[datetime] = None, until: Optional[datetime] = None,
+               plant_id: Optional[str] = None) -> List[Any]:
+    """
+    Audit rows newest first, ordered by (ts, id), as Core rows (id, ts,
+    plant_id, kind, detail_json). `before_id` is a keyset cursor: the page
+    continues strictly after that entry, so paging never scans the rows
+    already returned.
+    """
+    t = AuditORM.__table__
+    q = sa_select(t.c.id, t.c.ts, t.c.plant_id, t.c.kind, t.c.detail_json)
+    if plant_id is not None:
+        q = q.where(t.c.plant_id == plant_id)
+    if kinds:
+        q = q.where(t.c.kind.in_(kinds))
+    if since is not None:
+        q = q.where(t.c.ts >= since)
+    if until is not None:
+        q = q.where(t.c.ts < until)
+    q = q.order_by(t.c.ts.desc(), t.c.id.desc()).limit(limit)
+    with engine.connect() as conn:
+        if before_id is not None:
+            cursor_ts = conn.execute(sa_select(t.c.ts).where(t.c.id == before_id)).scalar()
+            if cursor_ts is None:
+                return []
+            q = q.where(tuple_(t.c.ts, t.c.id) < tuple_(cursor_ts, before_id))
+        return conn.execute(q).all()
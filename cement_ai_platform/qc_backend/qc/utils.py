@@ -1,27 +1,77 @@
-from collections import deque
-from typing import Dict, Deque
-from datetime import datetime, timezone
-
-def utcnow():
-    return datetime.now(tz=timezone.utc)
+import numpy as np
+from typing import Dict, Mapping, Optional, Sequence
 
 class RollingStats:
-    def __init__(self, maxlen: int, min_samples: int = 10):
-        self.buf: Dict[str, Deque[float]] = {}
-        self.maxlen = maxlen
+    """
+    Sliding-window mean/std over a fixed set of channels.
+
+    The window lives in one (maxlen, n_keys) array and the running sum and sum
+    of squares are kept per channel, so a sample updates every channel with one
+    vector add/subtract and `stats` is O(1) in the window length. Sums are taken
+    around the first sample seen (to avoid cancellation in the variance) and are
+    recomputed from the window every `maxlen` pushes to stop float drift.
+    """
+    def __init__(self, keys: Sequence[str], maxlen: int, min_samples: int = 10):
+        self.keys = list(keys)
+        self.index = {k: i for i, k in enumerate(self.keys)}
+        self.maxlen = int(maxlen)
         self.min_samples = min_samples
-    def add_key(self, k: str):
-        from collections import deque
-        if k not in self.buf:
-            self.buf[k] = deque(maxlen=self.maxlen)
-    def push(self, k: str, v: float):
-        self.add_key(k); self.buf[k].append(float(v))
+        self.buf = np.zeros((self.maxlen, len(self.keys)), dtype=np.float64)
+        self.n = 0       # samples currently in the window
+        self.pos = 0     # next slot to write
+        self._shift = None
+        self._sum = np.zeros(len(self.keys))
+        self._sumsq = np.zeros(len(self.keys))
+        self._since_resync = 0
+
+    def push(self, sample: Mapping[str, float]):
+        self.push_values(np.fromiter((sample[k] for k in self.keys), dtype=np.float64, count=len(self.keys)))
+
+    def push_values(self, x: np.ndarray):
+        """Push one sample given as a vector ordered like `keys`."""
+        if self._shift is None:
+            self._shift = x.copy()
+        d = x - self._shift
+        if self.n == self.maxlen:
+            old = self.buf[self.pos] - self._shift
+            self._sum += d - old
+            self._sumsq += d * d - old * old
+        else:
+            self._sum += d
+            self._sumsq += d * d
+            self.n += 1
+        self.buf[self.pos] = x
+        self.pos = (self.pos + 1) % self.maxlen
+        self._since_resync += 1
+        if self._since_resync >= self.maxlen:
+            self._resync()
+
+    def _resync(self):
+        w = self.buf[:self.n] - self._shift
+        self._sum = w.sum(axis=0)
+        self._sumsq = (w * w).sum(axis=0)
+        self._since_resync = 0
+
+    def last_values(self) -> np.ndarray:
+        return self.buf[(self.pos - 1) % self.maxlen]
+
+    def stats_all(self) -> Optional[Dict[str, np.ndarray]]:
+        """Vectors of mean/std/last/z for every key, or None while warming up."""
+        if self.n < self.min_samples:
+            return None
+        m = self._sum / self.n
+        var = np.maximum(self._sumsq / self.n - m * m, 0.0)
+        mu = m + self._shift
+        sd = np.sqrt(var) + 1e-6
+        last = self.last_values()
+        return {"mean": mu, "std": sd, "last": last, "z": np.abs((last - mu) / sd)}
+
     def stats(self, k: str):
-        import numpy as np
-        arr = self.buf.get(k)
-        if not arr or len(arr) < self.min_samples:
+        i = self.index.get(k)
+        if i is None or self.n < self.min_samples:
             return None
-        a = np.array(arr, dtype=float)
-        mu = float(a.mean()); sd = float(a.std() + 1e-6)
-        last = float(a[-1])
-        return {"mean": mu, "std": sd, "last": last, "z": abs((last-mu)/sd)}
+        m = self._sum[i] / self.n
+        mu = float(m + self._shift[i])
+        sd = float(np.sqrt(max(self._sumsq[i] / self.n - m * m, 0.0)) + 1e-6)
+        last = float(self.last_values()[i])
+        return {"mean": mu, "std": sd, "last": last, "z": abs((last - mu) / sd)}
@@ -0,0 +1,59 @@
+"""
+Compares the incremental RollingStats against the previous deque-based one
+on the DriftDetector workload: push one sample over all monitored channels,
+then query stats for the channels maybe_issue() looks at.
+
+    python scripts/bench_rolling_stats.py [window] [samples]
+"""
+import os, sys, time
+from collections import deque
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from qc.utils import RollingStats
+
+KEYS = ["SiO2_in","CaO_in","Moisture","Separator","Gypsum","LSF_est","Blaine_est","fCaO_est"]
+QUERIED = ["SiO2_in","CaO_in","Separator","LSF_est","Blaine_est","fCaO_est"]
+
+class DequeRollingStats:
+    # the implementation RollingStats replaced, kept here as the baseline
+    def __init__(self, maxlen, min_samples=10):
+        self.buf = {}; self.maxlen = maxlen; self.min_samples = min_samples
+    def push(self, k, v):
+        if k not in self.buf: self.buf[k] = deque(maxlen=self.maxlen)
+        self.buf[k].append(float(v))
+    def stats(self, k):
+        arr = self.buf.get(k)
+        if not arr or len(arr) < self.min_samples: return None
+        a = np.array(arr, dtype=float)
+        mu = float(a.mean()); sd = float(a.std() + 1e-6); last = float(a[-1])
+        return {"mean": mu, "std": sd, "last": last, "z": abs((last-mu)/sd)}
+
+def main(window=1800, n=20000):
+    rng = np.random.default_rng(0)
+    base = np.array([14.0, 43.0, 1.5, 120.0, 3.0, 100.0, 340.0, 0.1])
+    data = base + rng.normal(0, 1, (n, len(KEYS))) * np.array([0.5, 0.8, 0.2, 5, 0.5, 1, 5, 0.05])
+    samples = [dict(zip(KEYS, row)) for row in data.tolist()]
+
+    old = DequeRollingStats(window)
+    t0 = time.perf_counter()
+    for s in samples:
+        for k in KEYS: old.push(k, s[k])
+        ref = [old.stats(k) for k in QUERIED]
+    t_old = time.perf_counter() - t0
+
+    new = RollingStats(KEYS, window)
+    t0 = time.perf_counter()
+    for s in samples:
+        new.push(s)
+        got = [new.stats(k) for k in QUERIED]
+    t_new = time.perf_counter() - t0
+
+    err = max(abs(a[f] - b[f]) for a, b in zip(ref, got) for f in ("mean", "std"))
+    print(f"window={window} samples={n}")
+    print(f"deque + np.array : {t_old / n * 1e6:9.1f} us/sample")
+    print(f"incremental      : {t_new / n * 1e6:9.1f} us/sample  ({t_old / t_new:.0f}x)")
+    print(f"max |mean/std diff| on final window: {err:.2e}")
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:3]))
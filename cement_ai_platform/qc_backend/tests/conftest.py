@@ -0,0 +1,13 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# settings are read when qc.config is first imported: give the tests a dummy
+# key and keep their database out of the working tree
+os.environ.setdefault("GEMINI_API_KEY", "test")
+os.environ.setdefault("DB_PATH", os.path.join(tempfile.mkdtemp(prefix="qc-tests-"), "qc.db"))
+
+ROOT = Path(__file__).resolve().parents[1]
+os.chdir(ROOT)  # model paths in settings are relative to the backend directory
+sys.path.insert(0, str(ROOT))
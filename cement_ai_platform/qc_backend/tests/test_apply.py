@@ -0,0 +1,29 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import app as qc_app
+
+PLAN = {"issue": "test", "kpi_impact": {}, "actions": [{"knob": "sand_pct", "delta_pct": -0.5, "reason": "test"}]}
+
+
+@pytest.fixture
+def resumed_line(monkeypatch):
+    # as after warm() on a restart: numbering continues from stored history,
+    # but no sample has been produced by this process yet
+    ring = qc_app.plants.default.ring
+    monkeypatch.setattr(ring, "seq", ring.seq)
+    monkeypatch.setattr(ring, "base", ring.base)
+    ring.resume(500)
+    return qc_app.plants.default
+
+
+def test_apply_before_first_tick_is_503(resumed_line):
+    c = TestClient(qc_app.app)  # no lifespan: the simulator is not running
+    r = c.post("/plan/apply", json=PLAN)
+    assert r.status_code == 503
+    assert "no sample yet" in r.json()["detail"]
+    assert not resumed_line.plant._commands  # nothing was queued
+
+
+def test_state_current_before_first_tick_is_503(resumed_line):
+    assert TestClient(qc_app.app).get("/state/current").status_code == 503
@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.tree import DecisionTreeRegressor
+
+from qc import actions, kpi_model
+from qc.kpi_model import BLAINE_FEATURES, CompiledKPI
+from qc.schemas import PlanAction
+
+SAMPLE = {"SiO2_in": 14.2, "CaO_in": 42.8, "Moisture": 1.6, "Separator": 118.0, "Gypsum": 3.1}
+
+
+@pytest.fixture
+def tree_blaine(monkeypatch):
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame({"Separator": rng.uniform(110, 130, 200), "Gypsum": rng.uniform(2, 4, 200),
+                      "Moisture": rng.uniform(0.5, 3, 200)})
+    y = 340 + 2.0 * (X.Separator - 120) + 8.0 * (X.Gypsum - 3) - 4.0 * (X.Moisture - 1.5)
+    kpi = CompiledKPI(BLAINE_FEATURES, model=DecisionTreeRegressor(max_depth=6).fit(X, y))
+    assert not kpi.linear
+    monkeypatch.setattr(kpi_model, "blaine_kpi", kpi)
+    return kpi
+
+
+def test_nonlinear_batch_broadcasts_scalar_columns(tree_blaine):
+    out = tree_blaine.batch([118.0, 121.0, 125.0], [3.0, 3.2, 2.8], 1.6)
+    assert out.shape == (3,)
+    assert out.tolist() == [tree_blaine(118.0, 3.0, 1.6), tree_blaine(121.0, 3.2, 1.6), tree_blaine(125.0, 2.8, 1.6)]
+
+
+def test_simulate_after_batch_with_nonlinear_model(tree_blaine):
+    candidates = [
+        [PlanAction(knob="separator_speed", delta_pct=2.0, reason="t")],
+        [PlanAction(knob="gypsum_pct", delta_pct=-0.3, reason="t"), PlanAction(knob="sand_pct", delta_pct=1.0, reason="t")],
+        [],
+    ]
+    deltas = np.zeros((len(candidates), len(actions.KNOBS)))
+    rows, cols, d = actions.actions_to_arrays(candidates)
+    np.add.at(deltas, (rows, cols), d)
+    after = actions.simulate_after_batch(SAMPLE, deltas)
+    for i, acts in enumerate(candidates):
+        one = actions.simulate_after(SAMPLE, acts)
+        assert after["Blaine_est"][i] == pytest.approx(one["Blaine_est"])
+        assert after["LSF_est"][i] == pytest.approx(one["LSF_est"])
@@ -0,0 +1,35 @@
+import types
+
+import pytest
+
+from qc import planner_gemini
+from qc.schemas import Plan, PlanAction
+
+PLAN = Plan(issue="SiO2 high", kpi_impact={"LSF": "down"}, notes="optimizer",
+            actions=[PlanAction(knob="sand_pct", delta_pct=-0.5, reason="lower SiO2")])
+
+
+def reply_with(monkeypatch, text):
+    model = types.SimpleNamespace(generate_content=lambda prompt: types.SimpleNamespace(text=text))
+    monkeypatch.setattr(planner_gemini.genai, "configure", lambda **kw: None)
+    monkeypatch.setattr(planner_gemini.genai, "GenerativeModel", lambda name: model)
+
+
+@pytest.mark.parametrize("text", ['["not", "an", "object"]', '"just a string"', "42", "no json at all"])
+def test_explain_plan_keeps_plan_on_non_object_reply(monkeypatch, text):
+    reply_with(monkeypatch, text)
+    assert planner_gemini.explain_plan(PLAN, {}, "issue", {}) == PLAN
+
+
+def test_explain_plan_ignores_malformed_reasons(monkeypatch):
+    reply_with(monkeypatch, '{"issue": "reworded", "reasons": ["sand_pct"]}')
+    plan = planner_gemini.explain_plan(PLAN, {}, "issue", {})
+    assert plan.issue == "reworded"
+    assert [a.reason for a in plan.actions] == ["lower SiO2"]
+
+
+def test_explain_plan_uses_reasons(monkeypatch):
+    reply_with(monkeypatch, '```json\n{"reasons": {"sand_pct": "less silica"}, "notes": "llm"}\n```')
+    plan = planner_gemini.explain_plan(PLAN, {}, "issue", {})
+    assert [(a.knob, a.delta_pct, a.reason) for a in plan.actions] == [("sand_pct", -0.5, "less silica")]
+    assert plan.notes == "llm; optimizer"
@@ -0,0 +1,30 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import app as qc_app
+from qc.config import settings
+
+PLAN = {"issue": "test", "kpi_impact": {}, "actions": [{"knob": "sand_pct", "delta_pct": -0.5, "reason": "test"}]}
+
+
+@pytest.mark.parametrize("body", [
+    {"replicas": 20000},                     # too many replicas
+    {"horizon_s": 3600},                     # too long a horizon
+])
+def test_oversized_risk_request_is_422(body):
+    r = TestClient(qc_app.app).post("/plan/risk", json={"plan": PLAN, **body})
+    assert r.status_code == 422
+
+
+def test_replica_ticks_cap_is_422(monkeypatch):
+    # each factor within its bound, replicas x ticks over the cap
+    monkeypatch.setattr(settings, "RISK_MAX_REPLICA_TICKS", 1000)
+    r = TestClient(qc_app.app).post("/plan/risk", json={"plan": PLAN, "horizon_s": 600, "replicas": 100})
+    assert r.status_code == 422
+    assert "replicas x horizon ticks" in r.text
+
+
+def test_small_risk_request_is_accepted():
+    r = TestClient(qc_app.app).post("/plan/risk", json={"plan": PLAN, "horizon_s": 5, "replicas": 100, "seed": 1})
+    assert r.status_code == 200
+    assert r.json()["replicas"] == 100
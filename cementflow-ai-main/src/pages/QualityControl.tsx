@@ -57,6 +57,20 @@ interface SimulationResult {
   };
 }
 
+// 600 s of history at the simulator's 0.2 s tick
+const MAX_CHART_POINTS = 3000;
+
+const formatSample = (d: any) => {
+  if (!d.timestamp) {
+    return { ...d, timestamp: "Unknown Time" };
+  }
+  const date = new Date(d.timestamp);
+  return {
+    ...d,
+    timestamp: !isNaN(date.getTime()) ? date.toLocaleTimeString('en-US', { hour12: false, hour: '2-digit', minute: '2-digit', second: '2-digit' }) : "Invalid Time",
+  }
+};
+
 const QualityControl = () => {
   const [qcData, setQcData] = useState<QCData[]>([]);
   const [proposedPlan, setProposedPlan] = useState<Plan | null>(null);
@@ -65,35 +79,49 @@ const QualityControl = () => {
   const [disturbanceValue, setDisturbanceValue] = useState("SiO2_in_high");
   const [disturbanceMagnitude, setDisturbanceMagnitude] = useState(5);
   const { toast } = useToast();
-  const intervalRef = useRef<NodeJS.Timeout | null>(null);
+  const streamRef = useRef<EventSource | null>(null);
 
-  const fetchChartData = async () => {
+  // Returns the newest seq at backfill time, or null if the fetch failed
+  const fetchChartData = async (): Promise<number | null> => {
     try {
       const response = await fetch("http://localhost:8002/state/series?last_seconds=600");
       if (response.ok) {
         const data = await response.json();
-        const formattedData = data.map((d: any) => {
-          if (!d.timestamp) {
-            return { ...d, timestamp: "Unknown Time" };
-          }
-          const date = new Date(d.timestamp);
-          return {
-            ...d,
-            timestamp: !isNaN(date.getTime()) ? date.toLocaleTimeString('en-US', { hour12: false, hour: '2-digit', minute: '2-digit', second: '2-digit' }) : "Invalid Time",
-          }
-        });
-        setQcData(formattedData);
+        setQcData(data.map(formatSample));
+        const seq = response.headers.get("X-Last-Seq");
+        return seq !== null ? Number(seq) : null;
       }
     } catch (error) {
       console.error("Failed to fetch chart data", error);
     }
+    return null;
   };
 
   useEffect(() => {
-    fetchChartData();
-    intervalRef.current = setInterval(fetchChartData, 5000);
+    // Backfill the window once, then append samples pushed by /state/stream
+    // from the last backfilled seq (EventSource resumes from the last seen seq
+    // on reconnect). A `reset` means the server lost that seq, e.g. after a
+    // restart: backfill again and resubscribe from there.
+    let cancelled = false;
+    const subscribe = async () => {
+      const seq = await fetchChartData();
+      if (cancelled) return;
+      streamRef.current?.close();
+      const es = new EventSource(`http://localhost:8002/state/stream?lag=merge${seq != null ? `&since=${seq}` : ""}`);
+      es.addEventListener("sample", (ev) => {
+        const sample = formatSample(JSON.parse((ev as MessageEvent).data));
+        setQcData((prev) => [...prev, sample].slice(-MAX_CHART_POINTS));
+      });
+      es.addEventListener("reset", () => {
+        es.close();
+        if (!cancelled) subscribe();
+      });
+      streamRef.current = es;
+    };
+    subscribe();
     return () => {
-      if (intervalRef.current) clearInterval(intervalRef.current);
+      cancelled = true;
+      streamRef.current?.close();
     };
   }, []);
 